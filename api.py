@@ -1,16 +1,74 @@
 import aiohttp
 import asyncio
 import logging
+import time
+from collections import deque
+from types import SimpleNamespace
 import config
 
 bot_log = logging.getLogger('registration_bot')
 
+# The one aiohttp session for all outbound HTTP (player API and anything else).
+# bot.api_session is this same session; get it through create_client_session().
+
 api_session = None
 
+_latencies = deque(maxlen=config.HTTP_LATENCY_SAMPLES) # Seconds, most recent requests
+_metrics = {'requests': 0, 'failed': 0, 'in_flight': 0, 'connections_created': 0, 'connections_reused': 0,
+            'pool_waits': 0, 'pool_wait_seconds': 0.0}
+
+async def _on_request_start(session, ctx, params):
+    ctx.started_at = time.perf_counter()
+    _metrics['requests'] += 1
+    _metrics['in_flight'] += 1
+
+async def _on_request_end(session, ctx, params):
+    _metrics['in_flight'] -= 1
+    _latencies.append(time.perf_counter() - ctx.started_at)
+
+async def _on_request_exception(session, ctx, params):
+    _metrics['in_flight'] -= 1
+    _metrics['failed'] += 1
+
+async def _on_connection_queued_start(session, ctx, params):
+    ctx.queued_at = time.perf_counter()
+
+async def _on_connection_queued_end(session, ctx, params):
+    _metrics['pool_waits'] += 1
+    _metrics['pool_wait_seconds'] += time.perf_counter() - ctx.queued_at
+
+async def _on_connection_create_end(session, ctx, params):
+    _metrics['connections_created'] += 1
+
+async def _on_connection_reuseconn(session, ctx, params):
+    _metrics['connections_reused'] += 1
+
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace(started_at=0.0, queued_at=0.0))
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_end.append(_on_request_end)
+    trace.on_request_exception.append(_on_request_exception)
+    trace.on_connection_queued_start.append(_on_connection_queued_start)
+    trace.on_connection_queued_end.append(_on_connection_queued_end)
+    trace.on_connection_create_end.append(_on_connection_create_end)
+    trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return trace
+
 async def create_client_session():
     global api_session
     if api_session is None or api_session.closed:
-        api_session = aiohttp.ClientSession()
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_LIMIT,
+            limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config.HTTP_TIMEOUT_TOTAL,
+            connect=config.HTTP_TIMEOUT_CONNECT, # Includes waiting for a free pooled connection
+            sock_read=config.HTTP_TIMEOUT_SOCK_READ,
+        )
+        api_session = aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[_trace_config()])
         bot_log.info("aiohttp client session created.")
     return api_session
 
@@ -18,6 +76,8 @@ async def close_client_session():
     global api_session
     if api_session and not api_session.closed:
         await api_session.close()
+        # Give SSL transports a moment to close so shutdown doesn't log unclosed-connection warnings
+        await asyncio.sleep(0.25)
         bot_log.info("aiohttp client session closed.")
         api_session = None
 
@@ -26,3 +86,17 @@ async def make_api_request(method, url, headers=None, json_data=None):
     async with session.request(method, url, headers=headers, json=json_data) as response:
         response.raise_for_status()
         return await response.json()
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))] if samples else 0.0
+
+def get_stats() -> dict:
+    """Request latency percentiles (ms, over recent requests) and connection pool counters."""
+    samples = sorted(_latencies)
+    connector = api_session.connector if api_session and not api_session.closed else None
+    return {**_metrics,
+            'latency_p50_ms': _percentile(samples, 0.50) * 1000,
+            'latency_p95_ms': _percentile(samples, 0.95) * 1000,
+            'latency_p99_ms': _percentile(samples, 0.99) * 1000,
+            'pool_limit': connector.limit if connector else 0,
+            'pool_limit_per_host': connector.limit_per_host if connector else 0}
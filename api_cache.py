@@ -0,0 +1,105 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+import config
+import db_async
+
+bot_log = logging.getLogger('registration_bot')
+
+# Player API responses keyed by FID. Successful responses live in a bounded
+# in-memory LRU backed by the player_api_cache table, so they survive restarts;
+# both tiers expire after API_CACHE_TTL. Definitive errors (unknown player,
+# 4xx) are kept apart, in memory only, for the much shorter
+# API_NEGATIVE_CACHE_TTL. Transient failures (timeouts, 429, 5xx) are never cached.
+
+class ExpiringLRU:
+    """OrderedDict-based LRU whose entries also carry an absolute expiry time."""
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict() # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, now: float):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, expires_at: float):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+
+_responses = ExpiringLRU(config.API_CACHE_MEMORY_SIZE)
+_errors = ExpiringLRU(config.API_NEGATIVE_CACHE_SIZE)
+_stats = {'memory_hits': 0, 'db_hits': 0, 'negative_hits': 0, 'misses': 0}
+
+def _is_cacheable_error(result: dict) -> bool:
+    if result.get('error') == 'api_logic_fail':
+        return True
+    status = result.get('status')
+    return result.get('error') == 'http_error' and isinstance(status, int) and 400 <= status < 500 and status != 429
+
+async def get(fid: int) -> dict | None:
+    """Cached API result for `fid` (response data or error dict), or None on a miss."""
+    now = time.time()
+    data = _responses.get(fid, now)
+    if data is not None:
+        _stats['memory_hits'] += 1
+        return dict(data)
+    error = _errors.get(fid, now)
+    if error is not None:
+        _stats['negative_hits'] += 1
+        return dict(error)
+
+    row = await db_async.get_cached_player_response(fid, now - config.API_CACHE_TTL)
+    if row:
+        try:
+            data = json.loads(row['response'])
+        except ValueError:
+            bot_log.warning(f"Discarding unreadable cached API response for FID {fid}.")
+        else:
+            _responses.put(fid, data, row['fetched_at'] + config.API_CACHE_TTL)
+            _stats['db_hits'] += 1
+            return dict(data)
+
+    _stats['misses'] += 1
+    return None
+
+async def put(fid: int, result: dict | None):
+    """Records a call_player_api result; successes go to both tiers, definitive errors to the negative cache."""
+    if not result:
+        return
+    now = time.time()
+    if result.get('error'):
+        if _is_cacheable_error(result):
+            _errors.put(fid, dict(result), now + config.API_NEGATIVE_CACHE_TTL)
+        return
+
+    _errors.pop(fid)
+    _responses.put(fid, dict(result), now + config.API_CACHE_TTL)
+    await db_async.store_cached_player_response(fid, json.dumps(result), now)
+
+async def invalidate(fid: int):
+    _responses.pop(fid)
+    _errors.pop(fid)
+    await db_async.delete_cached_player_response(fid)
+
+def get_stats() -> dict:
+    hits = _stats['memory_hits'] + _stats['db_hits'] + _stats['negative_hits']
+    lookups = hits + _stats['misses']
+    return {**_stats, 'memory_size': len(_responses), 'negative_size': len(_errors),
+            'hit_rate': hits / lookups if lookups else 0.0}
@@ -3,12 +3,21 @@ from discord.ext import commands
 import config
 import logging
 import database
+import db_async
 import state
+import api
 import lookup
+import lookup_watcher
+import match_pool
+import verification_queue
 import ui_components
 import asyncio
 import aiohttp
+import importlib
 import os
+import time
+
+_process_started = time.perf_counter() # For the startup timing logged in on_ready
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -35,6 +44,14 @@ bot.persistent_channel_id: int | None = None
 bot.persistent_message_id: int | None = None
 bot.time_slot_counts = {} # Ensure these are initialized
 bot.substitute_counts = {} # Ensure these are initialized
+bot.counter_check_task: asyncio.Task | None = None
+bot.embed_dirty: asyncio.Event | None = None
+bot.embed_updater_task: asyncio.Task | None = None
+bot.registration_message: discord.PartialMessage | None = None # Cached target of embed edits
+bot.last_rendered_embed = None
+bot.lookup_watch_task: asyncio.Task | None = None
+bot.warm_up_task: asyncio.Task | None = None
+bot.verify_queue_task: asyncio.Task | None = None
 # Add active_events attribute to the bot instance
 bot.active_events = config.DEFAULT_ACTIVE_EVENTS
 
@@ -46,22 +63,44 @@ async def test_command(interaction: discord.Interaction):
     await interaction.response.send_message("Test command successful!", ephemeral=True)
 
 
+async def warm_up():
+    """Loads what the gateway connection doesn't need, after on_ready, without blocking the event loop."""
+    started = time.perf_counter()
+    await lookup.load_lookup_data_async(bot)
+    # Pick up edits to the lookup CSV made outside the bot
+    if bot.lookup_watch_task is None or bot.lookup_watch_task.done():
+        bot.lookup_watch_task = asyncio.create_task(lookup_watcher.watch_lookup_file(bot))
+
+    # Re-verify registrations saved while the player API was unavailable
+    if bot.verify_queue_task is None or bot.verify_queue_task.done():
+        bot.verify_queue_task = asyncio.create_task(verification_queue.run_verification_queue(bot))
+
+    # Modules only admin tools use; importing them now keeps the first use fast
+    for module_name in config.WARM_UP_MODULES:
+        try:
+            await asyncio.to_thread(importlib.import_module, module_name)
+        except ImportError as e:
+            bot_log.warning(f"Warm-up could not import {module_name}: {e}")
+    bot_log.info(f"Background warm-up finished in {time.perf_counter() - started:.2f}s.")
+
+
 @bot.event
 async def on_ready():
-    bot_log.info(f'Logged in as {bot.user.name} ({bot.user.id})')
+    bot_log.info(f'Logged in as {bot.user.name} ({bot.user.id}) {time.perf_counter() - _process_started:.2f}s after start')
 
     # Initialize database
-    database.initialize_databases()
+    await db_async.initialize_databases()
 
-    # Load lookup data
-    lookup.load_lookup_data(bot)
+    # Load lookup data and heavy modules in the background (once per process; on_ready can re-fire)
+    if bot.warm_up_task is None:
+        bot.warm_up_task = asyncio.create_task(warm_up())
 
     # Load persistent message IDs
     bot.persistent_channel_id, bot.persistent_message_id = state.load_registration_message_ids()
 
     # Initialize aiohttp session for API calls
-    if bot.api_session is None or bot.api_session.closed:
-       bot.api_session = aiohttp.ClientSession()
+    # Shared, tuned client from api.py; every outbound HTTP call uses this one session
+    bot.api_session = await api.create_client_session()
 
     # --- Debugging: Cog Loading and Command Inspection ---
     bot_log.info("--- Debugging: Attempting to load cogs and inspect commands ---")
@@ -221,8 +260,12 @@ async def on_ready():
     await state.recalculate_all_counters(bot)
     bot_log.info("Recalculated initial registration counters.")
 
+    # Periodically reconcile the delta-maintained counters with the DB (once per process; on_ready can re-fire)
+    if bot.counter_check_task is None or bot.counter_check_task.done():
+        bot.counter_check_task = asyncio.create_task(state.counter_consistency_loop(bot))
+
     # Update the persistent message embed on startup
-    asyncio.create_task(state.update_registration_embed(bot))
+    state.schedule_embed_update(bot)
     bot_log.info("Scheduled initial persistent embed update task.")
 
     # Add persistent views back to message if found
@@ -321,6 +364,15 @@ async def on_tree_error(interaction: discord.Interaction, error: discord.app_com
             await interaction.response.send_message(user_error_msg, ephemeral=True)
 
 
+async def run_bot():
+    async with bot:
+        try:
+            await bot.start(config.BOT_TOKEN, reconnect=True)
+        finally:
+            # Close the HTTP client while the event loop is still running
+            await api.close_client_session()
+
+
 # Run the bot
 if __name__ == "__main__":
     # Corrected the check to use config.BOT_TOKEN
@@ -328,5 +380,11 @@ if __name__ == "__main__":
         bot_log.critical("FATAL: BOT_TOKEN is not set in config.py or environment variables.")
         exit(1)
 
-    # Ensure the token passed to bot.run is config.BOT_TOKEN
-    bot.run(config.BOT_TOKEN, reconnect=True)
+    # Ensure the token passed to bot.start is config.BOT_TOKEN
+    try:
+        asyncio.run(run_bot())
+    except KeyboardInterrupt:
+        bot_log.info("Shutdown requested; closing.")
+    match_pool.shutdown()
+    db_async.shutdown()
+    database.close_all_connections()
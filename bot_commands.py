@@ -5,17 +5,21 @@ import discord.app_commands as app_commands
 from discord.app_commands import Choice
 
 import config
+import api
+import api_cache
+import bulk_verify
 import database
+import db_async
 import state
 import lookup
+import match_pool
 import registration
 import ui_components
+import verification_queue
 import logging
 import asyncio
 import io
-import pandas as pd
-from tabulate import tabulate
-from thefuzz import fuzz, process
+import time
 import functools
 import utils # Import the utils module
 
@@ -100,6 +104,69 @@ class BotCommands(commands.Cog):
     async def ping(self, interaction: discord.Interaction):
         await interaction.response.send_message(f"Pong! {round(self.bot.latency * 1000)}ms")
 
+    @app_commands.command(name="apistatus", description="Shows player API health, cache and connection stats.")
+    @app_commands.check(is_admin)
+    async def apistatus(self, interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        embed = discord.Embed(title=f"{config.EMOJI_VERIFY} Player API Status", color=config.COLOR_INFO)
+
+        breaker = registration.api_breaker.get_stats()
+        state_line = {'closed': f"{config.EMOJI_SUCCESS} **Closed** (calls flowing)",
+                      'open': f"{config.EMOJI_ERROR} **Open** for {breaker['open_for']:.0f}s, next probe in {breaker['probe_in']:.0f}s",
+                      'half_open': f"{config.EMOJI_WAIT} **Half-open** (probing for recovery)"}[breaker['state']]
+        embed.add_field(
+            name="Circuit Breaker",
+            value=(f"{state_line}\n"
+                   f"Last {config.API_BREAKER_WINDOW:.0f}s: {breaker['recent_failures']}/{breaker['recent_calls']} failed | "
+                   f"Times opened: {breaker['opened']} | Calls refused: {breaker['rejected']}"),
+            inline=False
+        )
+        queue = await db_async.get_verification_queue_stats()
+        worker = verification_queue.get_stats()
+        next_attempt = f" | Next retry in {max(0.0, queue['next_attempt_at'] - time.time()):.0f}s" if queue['next_attempt_at'] else ""
+        embed.add_field(
+            name="Re-verification Queue",
+            value=(f"Registrations pending verification: **{queue['pending_registrations']}**\n"
+                   f"Queued FIDs: {queue['queued']} (due: {queue['due']}, most attempts: {queue['max_attempts']}){next_attempt}\n"
+                   f"Verified: {worker['verified']} | Retried: {worker['retried']} | Dropped: {worker['dropped']}"),
+            inline=False
+        )
+        cache = api_cache.get_stats()
+        embed.add_field(
+            name="Response Cache",
+            value=(f"Hit rate: **{cache['hit_rate']:.0%}**\n"
+                   f"Memory hits: {cache['memory_hits']} | DB hits: {cache['db_hits']} | Negative hits: {cache['negative_hits']} | Misses: {cache['misses']}\n"
+                   f"Cached: {cache['memory_size']} players in memory, {cache['negative_size']} errors"),
+            inline=False
+        )
+        flights = registration.get_single_flight_stats()
+        prefetch = registration.get_prefetch_stats()
+        embed.add_field(
+            name="Upstream Calls",
+            value=(f"Sent: {flights['fetches']} | Coalesced into an in-flight call: {flights['coalesced']} | In flight now: {flights['in_flight']}\n"
+                   f"Speculative prefetches: {prefetch['started']} started, {prefetch['used']} used"),
+            inline=False
+        )
+        http = api.get_stats()
+        embed.add_field(
+            name="HTTP Client",
+            value=(f"Latency p50/p95/p99: {http['latency_p50_ms']:.0f} / {http['latency_p95_ms']:.0f} / {http['latency_p99_ms']:.0f} ms\n"
+                   f"Requests: {http['requests']} ({http['failed']} failed, {http['in_flight']} in flight)\n"
+                   f"Connections: {http['connections_created']} opened, {http['connections_reused']} reused | "
+                   f"Pool waits: {http['pool_waits']} ({http['pool_wait_seconds']:.1f}s total) | "
+                   f"Limit: {http['pool_limit_per_host']}/host, {http['pool_limit']} total"),
+            inline=False
+        )
+        limiter = registration.api_limiter.get_stats()
+        embed.add_field(
+            name="Rate Limiter",
+            value=(f"Rate: **{limiter['rate']:.2f}/s** (base {limiter['base_rate']:.2f}/s) | Tokens: {limiter['tokens']:.1f} | Queued: {limiter['queued']}\n"
+                   f"429s: {limiter['rate_limited']} | Gave up waiting: {limiter['gave_up']}"
+                   + (f"\n{config.EMOJI_WAIT} Paused for {limiter['paused_for']:.0f}s" if limiter['paused_for'] else "")),
+            inline=False
+        )
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
     @app_commands.command(name="settings", description="Administrator settings menu")
     @app_commands.check(is_admin) # Checks are back
     async def settings_menu(self, interaction: discord.Interaction):
@@ -125,12 +192,14 @@ class BotCommands(commands.Cog):
         event_name = event.value
         await interaction.response.defer(thinking=True)
 
-        registrations_data = database.get_registrations_for_viewregs(event_name)
+        registrations_data = await db_async.get_registrations_for_viewregs(event_name)
 
         if not registrations_data:
             await interaction.followup.send(f"{config.EMOJI_INFO} No registrations found for **{event_name}**.", ephemeral=True)
             return
 
+        import pandas as pd # Heavy; imported on first use (warmed up in the background after on_ready)
+        from tabulate import tabulate
         df = pd.DataFrame(registrations_data)
 
         df['Role'] = df.apply(lambda row: f"{config.EMOJI_CAPTAIN} Captain" if row['is_captain'] else f"{config.EMOJI_FUEL} Fuel Mgr" if row['fuel_mgr_status'] else "Member", axis=1)
@@ -164,6 +233,18 @@ class BotCommands(commands.Cog):
             await interaction.followup.send(f"{config.EMOJI_INFO} Registrations for **{event_name}**:\n{output}")
 
 
+    @app_commands.command(name="reverify", description="Refreshes FC levels from the game API for every registration in an event slot.")
+    @app_commands.choices(event=[
+        Choice(name=event_name, value=event_name) for event_name in config.DEFAULT_ACTIVE_EVENTS
+    ], time_slot=[
+        Choice(name=slot, value=slot) for slot in ["14UTC", "19UTC"]
+    ])
+    @app_commands.check(is_admin)
+    async def reverify(self, interaction: discord.Interaction, event: Choice[str], time_slot: Choice[str]):
+        await interaction.response.defer(thinking=True, ephemeral=True)
+        await self._run_reverification(interaction, event.value, time_slot.value)
+
+
     @app_commands.command(name="fuelme", description="Links your Discord account to your game FID for Fuel Manager role.")
     async def fuelme(self, interaction: discord.Interaction):
         # Assuming FuelMeModal is defined in ui_components.py
@@ -179,13 +260,13 @@ class BotCommands(commands.Cog):
         await interaction.response.defer(thinking=True, ephemeral=True)
         discord_id = interaction.user.id
 
-        linked_fid = database.get_linked_fid(discord_id)
+        linked_fid = await db_async.get_linked_fid(discord_id)
 
         if not linked_fid:
             await interaction.followup.send(f"{config.EMOJI_INFO} Your Discord account is not currently linked to a game FID.", ephemeral=True)
             return
 
-        success = database.unlink_discord_fid(discord_id)
+        success = await db_async.unlink_discord_fid(discord_id)
 
         if success:
             guild = await self.get_guild(interaction)
@@ -216,7 +297,7 @@ class BotCommands(commands.Cog):
     async def fuelmanagers(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        fuel_manager_fids = database.get_fuel_managers()
+        fuel_manager_fids = await db_async.get_fuel_managers()
         if not fuel_manager_fids:
             await interaction.followup.send(f"{config.EMOJI_INFO} No Fuel Managers currently registered.", ephemeral=True)
             return
@@ -228,7 +309,7 @@ class BotCommands(commands.Cog):
 
         lines = [f"{config.EMOJI_FUEL} **Current Fuel Managers:**"]
         for fid in fuel_manager_fids:
-            discord_id = database.get_linked_discord_user(fid)
+            discord_id = await db_async.get_linked_discord_user(fid)
             if discord_id:
                 member = guild.get_member(discord_id)
                 if member:
@@ -259,10 +340,10 @@ class BotCommands(commands.Cog):
              await interaction.followup.send(f"{config.EMOJI_ERROR} Invalid FID provided.", ephemeral=True)
              return
 
-        success = database.add_fuel_manager_role(fid)
+        success = await db_async.add_fuel_manager_role(fid)
 
         if success:
-            discord_id = database.get_linked_discord_user(fid)
+            discord_id = await db_async.get_linked_discord_user(fid)
             guild = await self.get_guild(interaction)
             role_added_msg = ""
             if discord_id and guild:
@@ -304,10 +385,10 @@ class BotCommands(commands.Cog):
              await interaction.followup.send(f"{config.EMOJI_ERROR} Invalid FID provided.", ephemeral=True)
              return
 
-        success = database.remove_fuel_manager_role(fid)
+        success = await db_async.remove_fuel_manager_role(fid)
 
         if success:
-            discord_id = database.get_linked_discord_user(fid)
+            discord_id = await db_async.get_linked_discord_user(fid)
             guild = await self.get_guild(interaction)
             role_removed_msg = ""
             if discord_id and guild:
@@ -452,9 +533,9 @@ class BotCommands(commands.Cog):
     async def handle_clear_from_ui(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
         try:
-            deleted_count = database.clear_all_registrations()
-            await state.recalculate_all_counters(self.bot)
-            asyncio.create_task(state.update_registration_embed(self.bot))
+            deleted_count = await db_async.clear_all_registrations()
+            state.reset_counters(self.bot)
+            state.schedule_embed_update(self.bot)
             await interaction.followup.send(f"{config.EMOJI_SUCCESS} Cleared all registrations ({deleted_count} records deleted).", ephemeral=True)
             bot_log.info(f"Admin {interaction.user.name} cleared all registrations.")
         except Exception as e:
@@ -540,6 +621,36 @@ class BotCommands(commands.Cog):
             await interaction.followup.send(f"{config.EMOJI_ERROR} An unexpected error occurred while processing the unregistration.", ephemeral=True)
 
 
+    async def _run_reverification(self, interaction: discord.Interaction, event: str, time_slot: str) -> dict:
+        """Runs bulk_verify.reverify_slot, showing live progress in an ephemeral followup. Interaction must be deferred."""
+        progress = {'total': 0, 'done': 0, 'failed': 0}
+        message = await interaction.followup.send(f"{config.EMOJI_VERIFY} Re-verifying FC levels for **{event} {time_slot}**...", ephemeral=True, wait=True)
+        job = asyncio.create_task(bulk_verify.reverify_slot(event, time_slot, progress))
+        while not job.done():
+            await asyncio.wait({job}, timeout=config.REVERIFY_PROGRESS_INTERVAL)
+            if not job.done():
+                try:
+                    await message.edit(content=f"{config.EMOJI_VERIFY} Re-verifying FC levels for **{event} {time_slot}**: "
+                                               f"{progress['done']}/{progress['total']} checked ({progress['failed']} failed)...")
+                except discord.HTTPException as e:
+                    bot_log.warning(f"Failed to update re-verification progress message: {e}")
+        result = job.result()
+
+        summary = (f"{config.EMOJI_SUCCESS if not result['failed'] else config.EMOJI_WARNING} Re-verified **{result['verified']}/{result['checked']}** "
+                   f"players for **{event} {time_slot}**: {result['changed']} FC level(s) changed, {result['renamed']} name(s) updated.")
+        if result['failed']:
+            failed = ', '.join(f"`{fid}` ({error})" for fid, error in result['failed'][:10])
+            summary += f"\n{config.EMOJI_WARNING} Could not verify: {failed}{'...' if len(result['failed']) > 10 else ''}"
+        if not result['saved']:
+            summary += f"\n{config.EMOJI_ERROR} Database error: the refreshed levels were not saved."
+        try:
+            await message.edit(content=summary)
+        except discord.HTTPException as e:
+            bot_log.warning(f"Failed to update re-verification summary message: {e}")
+        if result['renamed']:
+            state.schedule_embed_update(self.bot)
+        return result
+
     async def handle_assign_from_ui(self, interaction: discord.Interaction, event: str, time_slot: str):
         await interaction.response.defer(thinking=True, ephemeral=True)
         bot_log.info(f"Attempting to assign teams for {event} {time_slot}...")
@@ -553,16 +664,21 @@ class BotCommands(commands.Cog):
              bot_log.warning(f"Attempted to assign teams for unknown event type: {event}")
              return
 
+        # Teams are balanced on FC level, so refresh levels from the API first
+        reverify_result = await self._run_reverification(interaction, event, time_slot)
+        if reverify_result['checked'] and not reverify_result['saved']:
+            await interaction.followup.send(f"{config.EMOJI_WARNING} Could not save refreshed FC levels; assigning with the stored levels.", ephemeral=True)
+
         await interaction.followup.send(f"{config.EMOJI_WAIT} Assigning teams for **{event} {time_slot}**...", ephemeral=True)
 
 
         try:
             bot_log.info(f"Clearing existing assignments for {event} {time_slot}...")
-            database.clear_team_assignments_and_captains(event, time_slot)
+            await db_async.clear_team_assignments_and_captains(event, time_slot)
             bot_log.info("Existing assignments cleared.")
 
-            assignable_players = database.get_assignable_players(event, time_slot)
-            unassignable_names = database.get_unassignable_players_names(event, time_slot)
+            assignable_players = await db_async.get_assignable_players(event, time_slot)
+            unassignable_names = await db_async.get_unassignable_players_names(event, time_slot)
 
 
             if not assignable_players:
@@ -593,9 +709,9 @@ class BotCommands(commands.Cog):
                       # Assign the first player in the list as captain for this team
                       captain_set = False
                       for i, player in enumerate(players):
-                           database.update_player_team_assignment(player['chief_name'], event, time_slot, team_name)
+                           await db_async.update_player_team_assignment(player['chief_name'], event, time_slot, team_name)
                            if i == 0: # First player in the assigned list for this team
-                                database.update_player_captain_status(player['chief_name'], event, time_slot, team_name, 1)
+                                await db_async.update_player_captain_status(player['chief_name'], event, time_slot, team_name, 1)
                                 captain_set = True
                            assigned_count += 1
 
@@ -618,9 +734,8 @@ class BotCommands(commands.Cog):
             await interaction.followup.send(success_msg, embed=assignment_embed, ephemeral=True)
             bot_log.info(f"Team assignment successfully completed for {event} {time_slot}.")
 
-            # Recalculate and update embed after assignment
-            await state.recalculate_all_counters(self.bot)
-            asyncio.create_task(state.update_registration_embed(self.bot))
+            # Assignment doesn't change slot counts; just refresh the embed
+            state.schedule_embed_update(self.bot)
 
 
         except Exception as e:
@@ -655,7 +770,7 @@ class BotCommands(commands.Cog):
              return
 
 
-        reg_info = database.get_registration_by_user_event_slot_team(user_id, event_name, time_slot, team_assignment)
+        reg_info = await db_async.get_registration_by_user_event_slot_team(user_id, event_name, time_slot, team_assignment)
 
         if not reg_info:
              await interaction.followup.send(f"{config.EMOJI_WARNING} Could not find a registration for User ID `{user_id}` in **{event_name} {time_slot} Team {team_assignment}**.", ephemeral=True)
@@ -668,11 +783,11 @@ class BotCommands(commands.Cog):
 
         if new_status == 1:
             # If setting a new captain, clear the captain status for all other players in that specific team/slot/event
-            database.clear_other_captains_in_team(event_name, time_slot, team_assignment, chief_name)
+            await db_async.clear_other_captains_in_team(event_name, time_slot, team_assignment, chief_name)
             bot_log.info(f"   Cleared other captains in {event_name} {time_slot} Team {team_assignment} before setting {chief_name}.")
 
 
-        success = database.update_player_captain_status(chief_name, event_name, time_slot, team_assignment, new_status)
+        success = await db_async.update_player_captain_status(chief_name, event_name, time_slot, team_assignment, new_status)
 
         if success:
              action = "assigned as" if new_status == 1 else "removed as"
@@ -717,13 +832,14 @@ class BotCommands(commands.Cog):
         await interaction.response.defer(thinking=True, ephemeral=True)
         bot_log.info(f"Admin {original_interaction.user.name} selected event '{event_name}' for export.")
 
-        registrations_data = database.get_registrations_for_export(event_name)
+        registrations_data = await db_async.get_registrations_for_export(event_name)
 
         if not registrations_data:
             await interaction.followup.send(f"{config.EMOJI_INFO} No registrations found for **{event_name}** to export.", ephemeral=True)
             return
 
         try:
+            import pandas as pd # Heavy; imported on first use (warmed up in the background after on_ready)
             df = pd.DataFrame(registrations_data)
 
             output = io.BytesIO()
@@ -744,11 +860,15 @@ class BotCommands(commands.Cog):
     async def handle_reload_lookup_from_ui(self, interaction: discord.Interaction):
         await interaction.response.defer(thinking=True, ephemeral=True)
         try:
-            initial_count = len(self.bot.fid_lookup_data)
-            lookup.load_lookup_data(self.bot)
-            new_count = len(self.bot.fid_lookup_data)
-            await interaction.followup.send(f"{config.EMOJI_SUCCESS} Lookup data reloaded from `{config.FID_LOOKUP_CSV}`. {new_count} entries loaded (previously {initial_count}).", ephemeral=True)
-            bot_log.info(f"Admin {interaction.user.name} reloaded lookup data. {new_count} entries loaded.")
+            cache_stats = lookup.get_fuzzy_cache_stats()
+            bot_log.info(f"Fuzzy match cache before reload: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                         f"({cache_stats['hit_rate']:.0%}), {cache_stats['size']} cached queries.")
+            report = await lookup.reload_lookup_data(self.bot)
+            await interaction.followup.send(
+                f"{config.EMOJI_SUCCESS} Lookup data reloaded from `{config.FID_LOOKUP_CSV}` in {report['build_seconds'] * 1000:.0f} ms. "
+                f"{report['entries']} entries loaded (previously {report['previous_entries']}): "
+                f"{report['added']} added, {report['removed']} removed, {report['renamed']} changed.", ephemeral=True)
+            bot_log.info(f"Admin {interaction.user.name} reloaded lookup data. {report['entries']} entries loaded.")
         except FileNotFoundError:
             await interaction.followup.send(f"{config.EMOJI_ERROR} Lookup file `{config.FID_LOOKUP_CSV}` not found.", ephemeral=True)
             bot_log.error(f"Admin {interaction.user.name} attempted to reload lookup, but `{config.FID_LOOKUP_CSV}` was not found.")
@@ -768,6 +888,7 @@ class BotCommands(commands.Cog):
          table_data = [{"Chief Name": name, "FID": fid} for name, fid in sorted(lookup_entries, key=lambda item: item[0].lower())]
 
 
+         from tabulate import tabulate
          output = tabulate(table_data, headers='keys', tablefmt='pretty')
          output = f"```\n{output}\n```"
 
@@ -797,7 +918,7 @@ class BotCommands(commands.Cog):
                 return
 
             # Use lookup function that updates the bot cache and saves the file
-            success = lookup.add_lookup_entry(self.bot, chief_name, fid)
+            success = await lookup.add_lookup_entry(self.bot, chief_name, fid)
 
             if success:
                  await interaction.followup.send(f"{config.EMOJI_SUCCESS} Added/Updated lookup entry: **{chief_name}** (FID: `{fid}`).", ephemeral=True)
@@ -818,28 +939,13 @@ class BotCommands(commands.Cog):
               await interaction.followup.send(f"{config.EMOJI_ERROR} Chief Name cannot be empty for search.", ephemeral=True)
               return
 
-         # Use lookup function that searches the bot cache
-         all_entries = lookup.get_all_lookup_entries(self.bot) # Assuming this returns list of (name, fid) tuples
-         if not all_entries:
+         if not lookup.get_lookup_count(self.bot):
               await interaction.followup.send(f"{config.EMOJI_INFO} Lookup data is empty. Cannot search.", ephemeral=True)
               return
 
-         all_names = [name for name, fid in all_entries]
-
-         matches = process.extract(chief_name_search, all_names, scorer=fuzz.token_sort_ratio, limit=config.FUZZY_MATCH_LIMIT + 5)
-
-         found_matches = []
-         for name_match, score in matches:
-             if score >= config.FUZZY_MATCH_THRESHOLD:
-                 matched_fid = None
-                 # Find the FID for the matched name from the original entries
-                 for orig_name, fid_val in all_entries:
-                      if orig_name == name_match:
-                           matched_fid = fid_val
-                           break
-                 if matched_fid is not None:
-                      found_matches.append({"Chief Name": name_match, "FID": matched_fid, "Score": score})
-
+         # Full-roster token_sort_ratio search in the match process pool; already thresholded and best-first
+         matches = (await match_pool.match_names([chief_name_search], limit=config.FUZZY_MATCH_LIMIT + 5))[0]
+         found_matches = [{"Chief Name": name, "FID": fid, "Score": score} for name, fid, score in matches]
 
          if not found_matches:
               await interaction.followup.send(f"{config.EMOJI_INFO} No close matches found for '{chief_name_search}' in the lookup data.", ephemeral=True)
@@ -850,6 +956,7 @@ class BotCommands(commands.Cog):
 
          table_data = [{"Chief Name": m['Chief Name'], "FID": m['FID'], "Score": f"{m['Score']}%"} for m in found_matches[:config.FUZZY_MATCH_LIMIT]]
 
+         from tabulate import tabulate
          output = tabulate(table_data, headers='keys', tablefmt='pretty')
          output = f"```\n{output}\n```"
 
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+import config
+import db_async
+import rate_limiter
+import registration
+
+bot_log = logging.getLogger('registration_bot')
+
+# Admin-triggered refresh of every registration's FC level for one event slot,
+# run before team assignment so teams are balanced on current power. Calls go
+# through call_player_api at PRIORITY_BACKGROUND (rate limiter, circuit
+# breaker and single flight all apply), at most REVERIFY_CONCURRENCY at once,
+# and bypass the response cache. All results are written in one transaction.
+
+async def reverify_slot(event: str, time_slot: str, progress: dict | None = None) -> dict:
+    """Re-verifies every FID registered for (event, time_slot).
+
+    `progress`, if given, is kept up to date with 'total', 'done' and 'failed'
+    counts while the job runs, for the caller to display. Returns
+    {'checked', 'verified', 'changed', 'updated', 'renamed', 'failed': [(fid, error)], 'saved'}.
+    """
+    progress = progress if progress is not None else {}
+    rows = await db_async.get_fids_for_reverify(event, time_slot)
+    stored_levels = {row['player_fid']: row['verified_fc_level'] for row in rows}
+    progress.update(total=len(stored_levels), done=0, failed=0)
+    bot_log.info(f"Re-verifying {len(stored_levels)} FID(s) for {event} {time_slot}...")
+
+    semaphore = asyncio.Semaphore(config.REVERIFY_CONCURRENCY)
+    updates = []
+    failures = []
+
+    async def check(fid: int):
+        async with semaphore:
+            result = await registration.call_player_api(None, fid, use_cache=False, priority=rate_limiter.PRIORITY_BACKGROUND)
+        if result and not result.get("error"):
+            level = result.get("stove_lv")
+            updates.append({'player_fid': fid, 'chief_name': result.get("nickname"), 'verified_fc_level': level,
+                            'verified_fc_display': registration.get_display_level(level) if level is not None else None,
+                            'kingdom_id': result.get("kid")})
+        else:
+            failures.append((fid, (result.get("msg") or result.get("error")) if result else "No response"))
+            progress['failed'] += 1
+        progress['done'] += 1
+
+    await asyncio.gather(*(check(fid) for fid in stored_levels))
+
+    totals = await db_async.apply_player_verifications(updates) if updates else {'updated': 0, 'renamed': 0}
+    changed = sum(1 for update in updates
+                  if update['verified_fc_level'] is not None and update['verified_fc_level'] != stored_levels[update['player_fid']])
+    bot_log.info(f"Re-verification for {event} {time_slot}: {len(updates)}/{len(stored_levels)} verified, {changed} FC level(s) changed, "
+                 f"{len(failures)} failed{', NOT saved (database error)' if totals is None else ''}.")
+    return {'checked': len(stored_levels), 'verified': len(updates), 'changed': changed,
+            'updated': totals['updated'] if totals else 0, 'renamed': totals['renamed'] if totals else 0,
+            'failed': failures, 'saved': totals is not None}
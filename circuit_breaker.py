@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import deque
+
+bot_log = logging.getLogger('registration_bot')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Permit:
+    """Returned by CircuitBreaker.allow(); passed back with the call's outcome."""
+    __slots__ = ('probe_round',)
+
+    def __init__(self, probe_round: int | None = None):
+        self.probe_round = probe_round # The HALF_OPEN round this call probes for; None for a call admitted while CLOSED
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that is failing, and lets a few probes through to detect recovery.
+
+    CLOSED: calls flow. Trips to OPEN when, over the last `window` seconds, at
+    least `min_calls` calls were recorded and `failure_ratio` of them failed.
+    OPEN: calls are refused until `open_seconds` have passed, then HALF_OPEN.
+    HALF_OPEN: up to `probes` calls are let through; a success closes the
+    breaker, a failure re-opens it.
+
+    Callers get a Permit from allow() before the call (None means refused)
+    and pass it to exactly one of record_success(), record_failure() or
+    release() (neutral outcome) afterwards. Only the current round's probes
+    can change HALF_OPEN state; a call admitted while CLOSED that finishes
+    after the breaker opened is ignored.
+    """
+    def __init__(self, name: str, failure_ratio: float, min_calls: int, window: float, open_seconds: float, probes: int):
+        self.name = name
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self.outcomes = deque() # (monotonic time, succeeded)
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_round = 0 # Bumped on every entry to HALF_OPEN
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    def _trim(self, now: float):
+        while self.outcomes and self.outcomes[0][0] < now - self.window:
+            self.outcomes.popleft()
+
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self.opened_at = now
+        self.probes_in_flight = 0
+        self.stats['opened'] += 1
+        bot_log.warning(f"Circuit breaker '{self.name}' opened ({reason}); refusing calls for {self.open_seconds:.0f}s.")
+
+    def _is_probe(self, permit: Permit) -> bool:
+        return self.state == HALF_OPEN and permit.probe_round == self.probe_round
+
+    def allow(self) -> Permit | None:
+        now = time.monotonic()
+        if self.state == OPEN and now >= self.opened_at + self.open_seconds:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            self.probe_round += 1
+            bot_log.info(f"Circuit breaker '{self.name}' half-open; probing upstream.")
+        if self.state == CLOSED:
+            return Permit()
+        if self.state == HALF_OPEN and self.probes_in_flight < self.probes:
+            self.probes_in_flight += 1
+            return Permit(self.probe_round)
+        self.stats['rejected'] += 1
+        return None
+
+    def record_success(self, permit: Permit):
+        now = time.monotonic()
+        if self._is_probe(permit):
+            self.state = CLOSED
+            self.outcomes.clear()
+            bot_log.info(f"Circuit breaker '{self.name}' closed; upstream recovered.")
+            return
+        if self.state != CLOSED:
+            return # Started before the breaker opened (or a stale probe); says nothing about recovery
+        self.outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self, permit: Permit):
+        now = time.monotonic()
+        if self._is_probe(permit):
+            self._open(now, "probe failed")
+            return
+        if self.state != CLOSED:
+            return # Started before the breaker opened (or a stale probe)
+        self.outcomes.append((now, False))
+        self._trim(now)
+        failures = sum(1 for _, succeeded in self.outcomes if not succeeded)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_ratio:
+            self._open(now, f"{failures}/{len(self.outcomes)} calls failed in {self.window:.0f}s")
+
+    def release(self, permit: Permit):
+        """The allowed call ended without telling us anything about upstream health."""
+        if self._is_probe(permit) and self.probes_in_flight:
+            self.probes_in_flight -= 1
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        failures = sum(1 for _, succeeded in self.outcomes if not succeeded)
+        return {**self.stats, 'state': self.state, 'recent_calls': len(self.outcomes), 'recent_failures': failures,
+                'open_for': now - self.opened_at if self.state != CLOSED else 0.0,
+                'probe_in': max(0.0, self.opened_at + self.open_seconds - now) if self.state == OPEN else 0.0}
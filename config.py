@@ -9,13 +9,69 @@ ADMIN_ROLE_ID = int(os.getenv('ADMIN_ROLE_ID')) if os.getenv('ADMIN_ROLE_ID') el
 GUILD_ID = int(os.getenv('GUILD_ID')) if os.getenv('GUILD_ID') else None
 API_SECRET = os.getenv('API_SECRET')
 
-API_PLAYER_URL = 'https://wos-giftcode-api.centurygame.com/api/player'
+API_PLAYER_URL = os.getenv('API_PLAYER_URL', 'https://wos-giftcode-api.centurygame.com/api/player') # Point at fake_player_api.py for offline testing
 DB_MAIN_FILE = "registrations.db"
 FID_LOOKUP_CSV = "alliance_lookup.csv"
+FID_LOOKUP_JOURNAL = "alliance_lookup.csv.journal" # Append-only adds/removes not yet compacted into FID_LOOKUP_CSV
+LOOKUP_BACKEND = os.getenv('LOOKUP_BACKEND', 'csv').lower() # 'csv' or 'sqlite' (fid_lookup table in DB_MAIN_FILE)
 PERSISTENCE_FILE = "registration_message.txt"
 
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = 10.0 # Seconds to wait for a free pooled connection
+DB_CACHE_SIZE_KB = 16384 # Page cache per connection (PRAGMA cache_size, in KiB)
+DB_MMAP_SIZE = 64 * 1024 * 1024 # Bytes of the DB file to memory-map (PRAGMA mmap_size)
+DB_BUSY_TIMEOUT = 5.0 # Seconds sqlite waits on a locked database before raising
+DB_WRITE_BATCH_WINDOW = 0.005 # Seconds to collect registration writes before one group commit
+DB_WRITE_BATCH_MAX = 200 # Flush immediately once this many registrations are pending
+EMBED_UPDATE_INTERVAL = 2.0 # Minimum seconds between edits of the persistent registration embed
+COUNTER_CHECK_INTERVAL = 300 # Seconds between checks of in-memory slot counters against the DB
+
 FUZZY_MATCH_THRESHOLD = 50
 FUZZY_MATCH_LIMIT = 5
+NAME_PREFIX_MIN_LEN = 4 # Shortest normalized input that may resolve by prefix
+FUZZY_CANDIDATE_LIMIT = 300 # Names sharing the most trigrams with a query that get fully scored
+LOOKUP_JOURNAL_COMPACT_THRESHOLD = 100 # Journal records that trigger a rewrite of the lookup CSV
+LOOKUP_WATCH_DEBOUNCE = 1.0 # Seconds the lookup CSV must stay unchanged before edits are applied
+LOOKUP_WATCH_POLL_INTERVAL = 5.0 # Seconds between mtime checks when inotify is unavailable
+FUZZY_CACHE_SIZE = 1024 # Distinct normalized queries whose fuzzy results are kept (LRU)
+MATCH_POOL_WORKERS = int(os.getenv('MATCH_POOL_WORKERS', min(4, os.cpu_count() or 1))) # Processes for bulk fuzzy matching
+MATCH_POOL_CHUNK_SIZE = 64 # Queries scored per worker task
+WARM_UP_MODULES = ['pandas', 'tabulate', 'numpy', 'rapidfuzz.process'] # Imported in the background after on_ready, not at startup
+
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 6 * 3600)) # Seconds a successful player API response is reused
+API_CACHE_MEMORY_SIZE = 2048 # FIDs kept in the in-memory LRU tier (the SQLite tier is unbounded)
+API_NEGATIVE_CACHE_TTL = int(os.getenv('API_NEGATIVE_CACHE_TTL', 120)) # Seconds a definitive API error (e.g. unknown FID) is reused
+API_NEGATIVE_CACHE_SIZE = 1024
+API_RATE_PER_SECOND = float(os.getenv('API_RATE_PER_SECOND', 1.0)) # Steady-state player API calls per second
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', 5)) # Calls that may go out back-to-back after a quiet period
+API_RATE_MIN_PER_SECOND = 0.1 # Floor for the adaptive slowdown after 429s
+API_RATE_LIMIT_BACKOFF = 5.0 # Seconds to pause after a 429 without Retry-After (doubles per consecutive 429)
+API_RATE_LIMIT_MAX_BACKOFF = 60.0
+API_INTERACTIVE_MAX_WAIT = 10.0 # Longest a registration waits for a rate-limit slot before going unverified
+API_BACKGROUND_MAX_WAIT = 120.0 # Same for background jobs (retry queue, bulk re-verification)
+API_PREFETCH_CANDIDATES = 3 # Top fuzzy candidates fetched while the user is still picking one
+API_PREFETCH_RESERVE = 1 # Rate-limit tokens prefetching always leaves for real registrations
+API_BREAKER_FAILURE_RATIO = float(os.getenv('API_BREAKER_FAILURE_RATIO', 0.5)) # Share of failed calls that opens the breaker
+API_BREAKER_MIN_CALLS = 5 # Calls needed in the window before the ratio is trusted
+API_BREAKER_WINDOW = 60.0 # Seconds of call outcomes the ratio is computed over
+API_BREAKER_OPEN_SECONDS = float(os.getenv('API_BREAKER_OPEN_SECONDS', 30)) # How long to refuse calls before probing
+API_BREAKER_HALF_OPEN_PROBES = 1 # Calls let through at once while probing for recovery
+VERIFY_QUEUE_CONCURRENCY = 3 # Background re-verifications in flight at once
+VERIFY_QUEUE_BATCH_SIZE = 20 # Due FIDs picked up per pass
+VERIFY_QUEUE_BACKOFF = 30.0 # Seconds before the first retry of a failed re-verification; doubles per attempt
+VERIFY_QUEUE_MAX_BACKOFF = 1800.0
+VERIFY_QUEUE_IDLE_POLL = 60.0 # Longest the worker sleeps when nothing is due
+REVERIFY_CONCURRENCY = 5 # Player API calls in flight at once during a bulk re-verification
+REVERIFY_PROGRESS_INTERVAL = 2.0 # Seconds between progress message edits
+
+HTTP_POOL_LIMIT = 100 # Open connections across all hosts
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 10))
+HTTP_KEEPALIVE_TIMEOUT = 30.0 # Seconds an idle connection is kept for reuse
+HTTP_DNS_CACHE_TTL = 300 # Seconds resolved addresses are reused
+HTTP_TIMEOUT_TOTAL = 15.0 # Whole request, including reading the body
+HTTP_TIMEOUT_CONNECT = 5.0 # Getting a connection (pool wait + TCP/TLS connect)
+HTTP_TIMEOUT_SOCK_READ = 10.0 # Longest gap between received bytes
+HTTP_LATENCY_SAMPLES = 1000 # Recent requests kept for latency percentiles
 DEFAULT_ACTIVE_EVENTS = ["Foundry", "Canyon"]
 
 EMOJI_SUCCESS = "✅"; EMOJI_ERROR = "❌"; EMOJI_WARNING = "⚠️"; EMOJI_INFO = "ℹ️"
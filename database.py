@@ -2,13 +2,86 @@ import sqlite3
 import config
 import logging
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 
 bot_log = logging.getLogger('registration_bot')
 
+# --- Connection Pool ---
+# Connections are opened once, tuned with the PRAGMAs below and then reused by
+# every function in this module instead of reconnecting per query.
+_idle_connections = queue.LifoQueue()
+_all_connections = []
+_pool_lock = threading.Lock()
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(config.DB_MAIN_FILE, timeout=config.DB_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # ON CONFLICT REPLACE deletes only fire delete triggers with this on; registration_counts relies on them
+    conn.execute("PRAGMA recursive_triggers=ON")
+    bot_log.debug(f"Opened pooled SQLite connection to {config.DB_MAIN_FILE}.")
+    return conn
+
+def _acquire_connection() -> sqlite3.Connection:
+    try:
+        return _idle_connections.get_nowait()
+    except queue.Empty:
+        pass
+    with _pool_lock:
+        if len(_all_connections) < config.DB_POOL_SIZE:
+            conn = _open_connection()
+            _all_connections.append(conn)
+            return conn
+    try:
+        return _idle_connections.get(timeout=config.DB_POOL_TIMEOUT)
+    except queue.Empty:
+        raise sqlite3.OperationalError(f"Timed out after {config.DB_POOL_TIMEOUT}s waiting for a pooled database connection.")
+
+def _release_connection(conn: sqlite3.Connection):
+    conn.row_factory = None # Functions set sqlite3.Row per query; don't leak it to the next borrower
+    _idle_connections.put(conn)
+
+@contextmanager
+def get_connection():
+    """Borrows a pooled connection for the duration of the block.
+
+    Behaves like `with sqlite3.connect(...) as conn:` did: the transaction is
+    committed on success and rolled back on error, but the connection is
+    returned to the pool instead of being thrown away.
+    """
+    conn = _acquire_connection()
+    try:
+        with conn:
+            yield conn
+    finally:
+        _release_connection(conn)
+
+def close_all_connections():
+    with _pool_lock:
+        while True:
+            try:
+                _idle_connections.get_nowait()
+            except queue.Empty:
+                break
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                bot_log.warning(f"Error closing pooled database connection: {e}")
+        closed = len(_all_connections)
+        _all_connections.clear()
+    bot_log.info(f"Closed {closed} pooled database connection(s).")
+
 def initialize_databases():
     bot_log.info(f"Initializing database: {config.DB_MAIN_FILE}...")
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
 
             c.execute("""CREATE TABLE IF NOT EXISTS registrations (
@@ -27,6 +100,7 @@ def initialize_databases():
                             verified_fc_display TEXT,
                             is_captain INTEGER DEFAULT 0,
                             team_assignment TEXT,
+                            verification_pending INTEGER DEFAULT 0,
                             PRIMARY KEY (chief_name, event) ON CONFLICT REPLACE
                             )""")
             bot_log.info("Checked/Created 'registrations' table.")
@@ -38,7 +112,8 @@ def initialize_databases():
                 'verified_fc_level': 'INTEGER',
                 'verified_fc_display': 'TEXT',
                 'is_captain': 'INTEGER DEFAULT 0',
-                'team_assignment': 'TEXT'
+                'team_assignment': 'TEXT',
+                'verification_pending': 'INTEGER DEFAULT 0'
             }
             for col, col_type in cols_to_add.items():
                 if col not in existing_columns:
@@ -64,6 +139,84 @@ def initialize_databases():
             bot_log.info("Checked/Created 'player_roles' table.")
 
 
+            c.execute("""CREATE TABLE IF NOT EXISTS registration_counts (
+                            event TEXT NOT NULL,
+                            time_slot TEXT NOT NULL DEFAULT '',
+                            substitute INTEGER NOT NULL DEFAULT 0,
+                            count INTEGER NOT NULL DEFAULT 0,
+                            PRIMARY KEY (event, time_slot, substitute)
+                            )""")
+            bot_log.info("Checked/Created 'registration_counts' table.")
+
+            # Keep registration_counts in step with every insert/update/delete on registrations
+            c.execute("""CREATE TRIGGER IF NOT EXISTS trg_regs_count_insert AFTER INSERT ON registrations
+                         BEGIN
+                             INSERT INTO registration_counts (event, time_slot, substitute, count)
+                             VALUES (NEW.event, IFNULL(NEW.time_slot, ''), IFNULL(NEW.substitute, 0), 1)
+                             ON CONFLICT(event, time_slot, substitute) DO UPDATE SET count = count + 1;
+                         END""")
+            c.execute("""CREATE TRIGGER IF NOT EXISTS trg_regs_count_delete AFTER DELETE ON registrations
+                         BEGIN
+                             UPDATE registration_counts SET count = count - 1
+                             WHERE event = OLD.event AND time_slot = IFNULL(OLD.time_slot, '') AND substitute = IFNULL(OLD.substitute, 0);
+                             DELETE FROM registration_counts WHERE count <= 0;
+                         END""")
+            c.execute("""CREATE TRIGGER IF NOT EXISTS trg_regs_count_update AFTER UPDATE OF event, time_slot, substitute ON registrations
+                         WHEN OLD.event IS NOT NEW.event OR OLD.time_slot IS NOT NEW.time_slot OR OLD.substitute IS NOT NEW.substitute
+                         BEGIN
+                             UPDATE registration_counts SET count = count - 1
+                             WHERE event = OLD.event AND time_slot = IFNULL(OLD.time_slot, '') AND substitute = IFNULL(OLD.substitute, 0);
+                             INSERT INTO registration_counts (event, time_slot, substitute, count)
+                             VALUES (NEW.event, IFNULL(NEW.time_slot, ''), IFNULL(NEW.substitute, 0), 1)
+                             ON CONFLICT(event, time_slot, substitute) DO UPDATE SET count = count + 1;
+                             DELETE FROM registration_counts WHERE count <= 0;
+                         END""")
+            bot_log.info("Checked/Created registration_counts triggers.")
+
+            # Rows written before the triggers existed (or by an older bot version) are folded in here once at startup
+            _rebuild_registration_counts(c)
+            bot_log.info("Rebuilt 'registration_counts' from registrations.")
+
+            # Optional lookup roster backend (config.LOOKUP_BACKEND = 'sqlite'); keyed by FID so it joins to registrations.player_fid
+            c.execute("""CREATE TABLE IF NOT EXISTS fid_lookup (
+                            fid INTEGER PRIMARY KEY,
+                            chief_name TEXT NOT NULL COLLATE NOCASE UNIQUE
+                            )""")
+            bot_log.info("Checked/Created 'fid_lookup' table.")
+            _create_lookup_fts(c)
+
+            # Persistent tier of the player API response cache (see api_cache.py)
+            c.execute("""CREATE TABLE IF NOT EXISTS player_api_cache (
+                            player_fid INTEGER PRIMARY KEY,
+                            response TEXT NOT NULL,
+                            fetched_at REAL NOT NULL
+                            )""")
+            c.execute("DELETE FROM player_api_cache WHERE fetched_at < ?", (time.time() - config.API_CACHE_TTL,))
+            bot_log.info("Checked/Created 'player_api_cache' table.")
+
+            # FIDs whose registrations still need an API check (see verification_queue.py)
+            c.execute("""CREATE TABLE IF NOT EXISTS verification_queue (
+                            player_fid INTEGER PRIMARY KEY,
+                            attempts INTEGER NOT NULL DEFAULT 0,
+                            next_attempt_at REAL NOT NULL,
+                            last_error TEXT,
+                            enqueued_at REAL NOT NULL
+                            )""")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_verify_queue_due ON verification_queue (next_attempt_at);")
+            # FIDs the API said it will never verify; kept so the backfill below doesn't re-queue them
+            c.execute("""CREATE TABLE IF NOT EXISTS verification_dropped (
+                            player_fid INTEGER PRIMARY KEY,
+                            dropped_at REAL NOT NULL,
+                            last_error TEXT
+                            )""")
+            # Registrations saved unverified before the queue existed (or whose queue row was lost)
+            c.execute("""INSERT OR IGNORE INTO verification_queue (player_fid, next_attempt_at, enqueued_at)
+                         SELECT DISTINCT player_fid, ?, ? FROM registrations
+                         WHERE player_fid IS NOT NULL AND (verification_pending = 1 OR verified_fc_level IS NULL)
+                           AND player_fid NOT IN (SELECT player_fid FROM verification_dropped)""",
+                      (time.time(), time.time()))
+            bot_log.info("Checked/Created 'verification_queue' table.")
+
             c.execute("CREATE INDEX IF NOT EXISTS idx_regs_event_slot ON registrations (event, time_slot);")
             c.execute("CREATE INDEX IF NOT EXISTS idx_regs_user ON registrations (user_id);")
             c.execute("CREATE INDEX IF NOT EXISTS idx_regs_fid_event ON registrations (player_fid, event);")
@@ -80,40 +233,131 @@ def initialize_databases():
          bot_log.critical(f"FATAL: Unexpected error during database initialization: {e}", exc_info=True)
          raise
 
-def register_player(user_id: int, user_name: str, chief_name: str, entered_fc_level: int | None, event: str, substitute: int, time_slot: str, is_self_registration: int, player_fid: int | None, kingdom_id: int | None, verified_fc_level: int | None, verified_fc_display: str | None):
-    try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
-            c = conn.cursor()
-            c.execute("""INSERT INTO registrations
-                (user_id, user_name, chief_name, furnace_level, event, substitute, time_slot, date, is_self_registration,
-                player_fid, kingdom_id, verified_fc_level, verified_fc_display, is_captain, team_assignment)
-                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now', 'utc'), ?, ?, ?, ?, ?, 0, NULL)
-                ON CONFLICT(chief_name, event) DO UPDATE SET
-                    user_id=excluded.user_id,
-                    user_name=excluded.user_name,
-                    furnace_level=excluded.furnace_level,
-                    substitute=excluded.substitute,
-                    time_slot=excluded.time_slot,
-                    date=excluded.date,
-                    is_self_registration=excluded.is_self_registration,
-                    player_fid=excluded.player_fid,
-                    kingdom_id=excluded.kingdom_id,
-                    verified_fc_level=excluded.verified_fc_level,
-                    verified_fc_display=excluded.verified_fc_display,
-                    is_captain=excluded.is_captain,
-                    team_assignment=excluded.team_assignment
-                """,
+def _rebuild_registration_counts(c: sqlite3.Cursor):
+    c.execute("DELETE FROM registration_counts")
+    c.execute("""INSERT INTO registration_counts (event, time_slot, substitute, count)
+                 SELECT event, IFNULL(time_slot, ''), IFNULL(substitute, 0), COUNT(*)
+                 FROM registrations
+                 GROUP BY event, IFNULL(time_slot, ''), IFNULL(substitute, 0)""")
+
+def _create_lookup_fts(c: sqlite3.Cursor):
+    """Creates the FTS5 trigram index over fid_lookup names, if this SQLite build supports it."""
+    try:
+        c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS fid_lookup_fts
+                     USING fts5(chief_name, content='fid_lookup', content_rowid='fid', tokenize='trigram')""")
+    except sqlite3.OperationalError as e:
+        bot_log.warning(f"FTS5 trigram search unavailable ({e}); lookup candidates will be found in memory.")
+        return
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_lookup_fts_insert AFTER INSERT ON fid_lookup
+                 BEGIN
+                     INSERT INTO fid_lookup_fts (rowid, chief_name) VALUES (NEW.fid, NEW.chief_name);
+                 END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_lookup_fts_delete AFTER DELETE ON fid_lookup
+                 BEGIN
+                     INSERT INTO fid_lookup_fts (fid_lookup_fts, rowid, chief_name) VALUES ('delete', OLD.fid, OLD.chief_name);
+                 END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_lookup_fts_update AFTER UPDATE ON fid_lookup
+                 BEGIN
+                     INSERT INTO fid_lookup_fts (fid_lookup_fts, rowid, chief_name) VALUES ('delete', OLD.fid, OLD.chief_name);
+                     INSERT INTO fid_lookup_fts (rowid, chief_name) VALUES (NEW.fid, NEW.chief_name);
+                 END""")
+    bot_log.info("Checked/Created 'fid_lookup_fts' trigram index.")
+
+_REGISTER_PLAYER_SQL = """INSERT INTO registrations
+    (user_id, user_name, chief_name, furnace_level, event, substitute, time_slot, date, is_self_registration,
+    player_fid, kingdom_id, verified_fc_level, verified_fc_display, is_captain, team_assignment, verification_pending)
+    VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now', 'utc'), ?, ?, ?, ?, ?, 0, NULL, ?)
+    ON CONFLICT(chief_name, event) DO UPDATE SET
+        user_id=excluded.user_id,
+        user_name=excluded.user_name,
+        furnace_level=excluded.furnace_level,
+        substitute=excluded.substitute,
+        time_slot=excluded.time_slot,
+        date=excluded.date,
+        is_self_registration=excluded.is_self_registration,
+        player_fid=excluded.player_fid,
+        kingdom_id=excluded.kingdom_id,
+        verified_fc_level=excluded.verified_fc_level,
+        verified_fc_display=excluded.verified_fc_display,
+        is_captain=excluded.is_captain,
+        team_assignment=excluded.team_assignment,
+        verification_pending=excluded.verification_pending
+    """
+
+_ENQUEUE_VERIFICATION_SQL = """INSERT OR IGNORE INTO verification_queue (player_fid, next_attempt_at, enqueued_at)
+    VALUES (?, ?, ?)"""
+
+def register_player(user_id: int, user_name: str, chief_name: str, entered_fc_level: int | None, event: str, substitute: int, time_slot: str, is_self_registration: int, player_fid: int | None, kingdom_id: int | None, verified_fc_level: int | None, verified_fc_display: str | None, verification_pending: int = 0):
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute(_REGISTER_PLAYER_SQL,
                 (user_id, user_name, chief_name, entered_fc_level, event, substitute, time_slot, is_self_registration,
-                 player_fid, kingdom_id, verified_fc_level, verified_fc_display))
+                 player_fid, kingdom_id, verified_fc_level, verified_fc_display, verification_pending))
+            if verification_pending and player_fid is not None:
+                c.execute(_ENQUEUE_VERIFICATION_SQL, (player_fid, time.time(), time.time()))
             conn.commit()
         return True
     except sqlite3.Error as e:
         bot_log.error(f"Database error registering player '{chief_name}' for '{event}': {e}", exc_info=True)
         return False
 
+def _failed_batch_result() -> dict:
+    return {'success': False, 'updated_existing': False, 'link_added': None, 'previous_time_slot': None, 'previous_substitute': None}
+
+def register_players_batch(registrations: list[dict]) -> list[dict]:
+    """Writes many registrations in a single transaction (one fsync for the whole batch).
+
+    Each item holds the keyword arguments of register_player plus an optional
+    'link_discord_id'; when set (self-registrations with a FID) the Discord link
+    is inserted like link_discord_fid does. Every item runs inside its own
+    savepoint so one bad row does not fail the rest. Returns one result dict per
+    item, in order: {'success', 'updated_existing', 'link_added',
+    'previous_time_slot', 'previous_substitute'}. 'updated_existing' is True
+    when the ON CONFLICT branch replaced an existing registration for that chief
+    name and event, in which case the previous_* keys hold the replaced values.
+    """
+    results = []
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            # Without an outer transaction the first SAVEPOINT would become it, and every RELEASE would commit
+            c.execute("BEGIN IMMEDIATE")
+            for reg in registrations:
+                chief_name, event = reg['chief_name'], reg['event']
+                c.execute("SAVEPOINT batch_item")
+                try:
+                    c.execute("SELECT time_slot, substitute FROM registrations WHERE chief_name = ? AND event = ? LIMIT 1", (chief_name, event))
+                    previous = c.fetchone()
+                    c.execute(_REGISTER_PLAYER_SQL,
+                        (reg['user_id'], reg['user_name'], chief_name, reg['entered_fc_level'], event, reg['substitute'],
+                         reg['time_slot'], reg['is_self_registration'], reg['player_fid'], reg['kingdom_id'],
+                         reg['verified_fc_level'], reg['verified_fc_display'], reg.get('verification_pending', 0)))
+                    if reg.get('verification_pending') and reg['player_fid'] is not None:
+                        # Queued in the same transaction, so a saved unverified registration is never forgotten
+                        c.execute(_ENQUEUE_VERIFICATION_SQL, (reg['player_fid'], time.time(), time.time()))
+                    link_added = None
+                    if reg.get('link_discord_id') is not None and reg['player_fid'] is not None:
+                        c.execute("INSERT OR IGNORE INTO discord_links (discord_id, player_fid) VALUES (?, ?)", (reg['link_discord_id'], reg['player_fid']))
+                        link_added = c.rowcount > 0
+                    c.execute("RELEASE SAVEPOINT batch_item")
+                    results.append({'success': True, 'updated_existing': previous is not None, 'link_added': link_added,
+                                    'previous_time_slot': previous[0] if previous else None,
+                                    'previous_substitute': previous[1] if previous else None})
+                except sqlite3.Error as e:
+                    c.execute("ROLLBACK TO SAVEPOINT batch_item")
+                    c.execute("RELEASE SAVEPOINT batch_item")
+                    bot_log.error(f"Database error registering player '{chief_name}' for '{event}' in batch: {e}", exc_info=True)
+                    results.append(_failed_batch_result())
+            conn.commit()
+        return results
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error committing registration batch of {len(registrations)}: {e}", exc_info=True)
+        return [_failed_batch_result() for _ in registrations]
+
 def unregister_player(chief_name: str, event: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("DELETE FROM registrations WHERE chief_name = ? AND event = ?", (chief_name, event))
             deleted_rows = c.rowcount
@@ -125,7 +369,7 @@ def unregister_player(chief_name: str, event: str):
 
 def is_registered(chief_name: str, event: str) -> bool:
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("SELECT 1 FROM registrations WHERE chief_name = ? AND event = ? LIMIT 1", (chief_name, event))
             result = c.fetchone()
@@ -136,7 +380,7 @@ def is_registered(chief_name: str, event: str) -> bool:
 
 def get_registration_count(event: str, slot_type: str) -> int:
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             substitute_flag = 1 if slot_type.lower() == 'substitute' else 0
             c.execute("SELECT COUNT(*) FROM registrations WHERE event = ? AND substitute = ?", (event, substitute_flag))
@@ -148,7 +392,7 @@ def get_registration_count(event: str, slot_type: str) -> int:
 
 def get_all_registrations():
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("SELECT event, time_slot, substitute FROM registrations")
@@ -158,9 +402,24 @@ def get_all_registrations():
         bot_log.error(f"Database error getting all registrations: {e}", exc_info=True)
         return []
 
+def get_registration_counts():
+    """Reads the trigger-maintained per (event, time_slot, substitute) counts; cost grows with slots, not registrations."""
+    try:
+        with get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT event, time_slot, substitute, count FROM registration_counts WHERE count > 0")
+            counts = [dict(row) for row in c.fetchall()]
+        for row in counts:
+            row['time_slot'] = row['time_slot'] or None # '' stands in for a NULL slot in the keyed table
+        return counts
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error getting registration counts: {e}", exc_info=True)
+        return []
+
 def link_discord_fid(discord_id: int, player_fid: int):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("INSERT OR IGNORE INTO discord_links (discord_id, player_fid) VALUES (?, ?)", (discord_id, player_fid))
             conn.commit()
@@ -171,7 +430,7 @@ def link_discord_fid(discord_id: int, player_fid: int):
 
 def unlink_discord_fid(discord_id: int):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("DELETE FROM discord_links WHERE discord_id = ?", (discord_id,))
             deleted_rows = c.rowcount
@@ -184,7 +443,7 @@ def unlink_discord_fid(discord_id: int):
 
 def get_linked_fid(discord_id: int) -> int | None:
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("SELECT player_fid FROM discord_links WHERE discord_id = ?", (discord_id,))
             result = c.fetchone()
@@ -195,7 +454,7 @@ def get_linked_fid(discord_id: int) -> int | None:
 
 def get_linked_discord_user(player_fid: int) -> int | None:
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("SELECT discord_id FROM discord_links WHERE player_fid = ?", (player_fid,))
             result = c.fetchone()
@@ -207,7 +466,7 @@ def get_linked_discord_user(player_fid: int) -> int | None:
 
 def get_user_registrations(user_id: int):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT event, time_slot, substitute, furnace_level, chief_name, player_fid, verified_fc_display
@@ -222,7 +481,7 @@ def get_user_registrations(user_id: int):
 
 def get_registration_by_fid_event(player_fid: int, event: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT chief_name FROM registrations
@@ -236,7 +495,7 @@ def get_registration_by_fid_event(player_fid: int, event: str):
 
 def get_registration_by_chief_name_event(chief_name: str, event: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT * FROM registrations
@@ -250,7 +509,7 @@ def get_registration_by_chief_name_event(chief_name: str, event: str):
 
 def get_registration_by_chief_name_event_slot(chief_name: str, event: str, time_slot: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT * FROM registrations
@@ -264,7 +523,7 @@ def get_registration_by_chief_name_event_slot(chief_name: str, event: str, time_
 
 def get_registration_by_user_event_slot_team(user_id: int, event: str, time_slot: str, team: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT * FROM registrations
@@ -279,7 +538,7 @@ def get_registration_by_user_event_slot_team(user_id: int, event: str, time_slot
 
 def clear_all_registrations():
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("DELETE FROM registrations")
             deleted_rows = c.rowcount
@@ -292,7 +551,7 @@ def clear_all_registrations():
 
 def get_registrations_for_export(event_name: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT r.chief_name, r.player_fid, r.verified_fc_display, r.furnace_level,
@@ -310,7 +569,7 @@ def get_registrations_for_export(event_name: str):
 
 def get_registrations_for_viewregs(event_name: str):
      try:
-         with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+         with get_connection() as conn:
              conn.row_factory = sqlite3.Row
              c = conn.cursor()
              c.execute("""
@@ -331,7 +590,7 @@ def get_registrations_for_viewregs(event_name: str):
 
 def get_players_for_captain_select(event: str, time_slot: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("""SELECT chief_name, is_captain
                               FROM registrations
@@ -346,7 +605,7 @@ def get_players_for_captain_select(event: str, time_slot: str):
 
 def get_team_members_for_captain_select(event: str, time_slot: str, team: str):
      try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("""SELECT chief_name, is_captain
                               FROM registrations
@@ -361,7 +620,7 @@ def get_team_members_for_captain_select(event: str, time_slot: str, team: str):
 
 def update_captain_status(chief_name: str, event: str, time_slot: str, new_status: int) -> bool:
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("UPDATE registrations SET is_captain = ? WHERE chief_name = ? AND event = ? AND time_slot = ?",
                        (new_status, chief_name, event, time_slot))
@@ -373,7 +632,7 @@ def update_captain_status(chief_name: str, event: str, time_slot: str, new_statu
 
 def get_registration_by_chief_name_event_slot_team(chief_name: str, event: str, time_slot: str, team: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""SELECT * FROM registrations
@@ -387,7 +646,7 @@ def get_registration_by_chief_name_event_slot_team(chief_name: str, event: str,
 
 def clear_other_captains_in_team(event: str, time_slot: str, team: str, chief_name_to_keep: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("""UPDATE registrations SET is_captain = 0
                          WHERE event = ? AND time_slot = ? AND team_assignment = ? AND chief_name != ? AND is_captain = 1""",
@@ -401,7 +660,7 @@ def clear_other_captains_in_team(event: str, time_slot: str, team: str, chief_na
 
 def clear_team_assignments_and_captains(event: str, time_slot: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("UPDATE registrations SET team_assignment = NULL, is_captain = 0 WHERE event = ? AND time_slot = ?", (event, time_slot))
             conn.commit()
@@ -412,7 +671,7 @@ def clear_team_assignments_and_captains(event: str, time_slot: str):
 
 def update_player_team_assignment(chief_name: str, event: str, time_slot: str, team: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("UPDATE registrations SET team_assignment = ? WHERE chief_name = ? AND event = ? AND time_slot = ?",
                        (team, chief_name, event, time_slot))
@@ -424,7 +683,7 @@ def update_player_team_assignment(chief_name: str, event: str, time_slot: str, t
 
 def update_player_captain_status(chief_name: str, event: str, time_slot: str, team: str, status: int):
      try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("UPDATE registrations SET is_captain = ? WHERE chief_name = ? AND event = ? AND time_slot = ? AND team_assignment = ?",
                            (status, chief_name, event, time_slot, team))
@@ -436,7 +695,7 @@ def update_player_captain_status(chief_name: str, event: str, time_slot: str, te
 
 def get_assignable_players(event: str, time_slot: str):
      try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("""
@@ -454,7 +713,7 @@ def get_assignable_players(event: str, time_slot: str):
 
 def get_unassignable_players_names(event: str, time_slot: str):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("""SELECT chief_name
                           FROM registrations
@@ -465,9 +724,24 @@ def get_unassignable_players_names(event: str, time_slot: str):
         bot_log.error(f"Database error getting unassignable players names ('{event}' '{time_slot}'): {e}", exc_info=True)
         return []
 
+def get_fids_for_reverify(event: str, time_slot: str) -> list[dict]:
+    """Distinct FIDs registered for an event slot with their stored FC level: [{'player_fid', 'verified_fc_level'}]."""
+    try:
+        with get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("""SELECT player_fid, MAX(verified_fc_level) AS verified_fc_level FROM registrations
+                         WHERE event = ? AND time_slot = ? AND player_fid IS NOT NULL
+                         GROUP BY player_fid""", (event, time_slot))
+            rows = [dict(row) for row in c.fetchall()]
+        return rows
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error getting FIDs to re-verify ('{event}' '{time_slot}'): {e}", exc_info=True)
+        return []
+
 def add_fuel_manager_role(fid: int):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("""
                 INSERT INTO player_roles (player_fid, is_fuel_manager) VALUES (?, 1)
@@ -481,7 +755,7 @@ def add_fuel_manager_role(fid: int):
 
 def remove_fuel_manager_role(fid: int):
     try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             c = conn.cursor()
             c.execute("UPDATE player_roles SET is_fuel_manager = 0 WHERE player_fid = ?", (fid,))
             conn.commit()
@@ -492,7 +766,7 @@ def remove_fuel_manager_role(fid: int):
 
 def get_fuel_managers():
      try:
-        with sqlite3.connect(config.DB_MAIN_FILE) as conn:
+        with get_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("SELECT player_fid FROM player_roles WHERE is_fuel_manager = 1")
@@ -502,3 +776,224 @@ def get_fuel_managers():
          bot_log.error(f"Database error getting fuel managers: {e}", exc_info=True)
          return []
 
+
+# --- Lookup Roster (LOOKUP_BACKEND = 'sqlite') ---
+
+def get_lookup_entries() -> list[tuple[str, int]] | None:
+    """The whole lookup roster as (chief_name, fid) pairs, or None on a DB error (never an empty stand-in)."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT chief_name, fid FROM fid_lookup")
+            return [(row[0], row[1]) for row in c.fetchall()]
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error reading lookup roster: {e}", exc_info=True)
+        return None
+
+def replace_lookup_entries(entries: list[tuple[str, int]]) -> bool:
+    """Replaces the whole lookup roster with `entries` in one transaction (CSV import)."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM fid_lookup")
+            c.executemany("INSERT INTO fid_lookup (chief_name, fid) VALUES (?, ?)", entries)
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error replacing lookup roster ({len(entries)} entries): {e}", exc_info=True)
+        return False
+
+def add_lookup_entry(chief_name: str, fid: int) -> bool:
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("INSERT INTO fid_lookup (chief_name, fid) VALUES (?, ?)", (chief_name, fid))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error adding lookup entry '{chief_name}' -> {fid}: {e}", exc_info=True)
+        return False
+
+def remove_lookup_entry(fid: int) -> bool:
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM fid_lookup WHERE fid = ?", (fid,))
+            conn.commit()
+        return c.rowcount > 0
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error removing lookup entry {fid}: {e}", exc_info=True)
+        return False
+
+def search_lookup_candidates(trigrams: list[str], limit: int) -> list[str] | None:
+    """Names sharing trigrams with a query, best bm25 rank first. None if FTS5 search isn't available."""
+    if not trigrams:
+        return None
+    match = ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in trigrams)
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""SELECT chief_name FROM fid_lookup_fts
+                         WHERE fid_lookup_fts MATCH ? ORDER BY rank LIMIT ?""", (match, limit))
+            return [row[0] for row in c.fetchall()]
+    except sqlite3.Error as e:
+        bot_log.warning(f"FTS5 lookup search failed ({e}); using in-memory candidates.")
+        return None
+
+
+# --- Player API Response Cache ---
+
+def get_cached_player_response(player_fid: int, fetched_after: float) -> dict | None:
+    """Returns {'response': json text, 'fetched_at': epoch seconds} if fetched after `fetched_after`."""
+    try:
+        with get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("SELECT response, fetched_at FROM player_api_cache WHERE player_fid = ? AND fetched_at >= ?",
+                      (player_fid, fetched_after))
+            row = c.fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error reading cached API response for FID {player_fid}: {e}", exc_info=True)
+        return None
+
+def store_cached_player_response(player_fid: int, response: str, fetched_at: float) -> bool:
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""INSERT INTO player_api_cache (player_fid, response, fetched_at) VALUES (?, ?, ?)
+                         ON CONFLICT(player_fid) DO UPDATE SET response = excluded.response, fetched_at = excluded.fetched_at""",
+                      (player_fid, response, fetched_at))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error caching API response for FID {player_fid}: {e}", exc_info=True)
+        return False
+
+def delete_cached_player_response(player_fid: int) -> bool:
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM player_api_cache WHERE player_fid = ?", (player_fid,))
+            conn.commit()
+        return c.rowcount > 0
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error deleting cached API response for FID {player_fid}: {e}", exc_info=True)
+        return False
+
+# --- Re-verification Queue ---
+
+def get_due_verifications(now: float, limit: int) -> list[dict]:
+    """Queued FIDs whose next attempt is due, oldest due first: [{'player_fid', 'attempts'}]."""
+    try:
+        with get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            c = conn.cursor()
+            c.execute("""SELECT player_fid, attempts FROM verification_queue
+                         WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?""", (now, limit))
+            rows = [dict(row) for row in c.fetchall()]
+        return rows
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error reading the verification queue: {e}", exc_info=True)
+        return []
+
+def reschedule_verification(player_fid: int, next_attempt_at: float, last_error: str) -> bool:
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""UPDATE verification_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                         WHERE player_fid = ?""", (next_attempt_at, last_error, player_fid))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error rescheduling verification for FID {player_fid}: {e}", exc_info=True)
+        return False
+
+def drop_verification(player_fid: int, last_error: str) -> bool:
+    """Removes a FID the API will never verify (e.g. unknown player), clears its pending flags and remembers the drop."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM verification_queue WHERE player_fid = ?", (player_fid,))
+            c.execute("INSERT OR REPLACE INTO verification_dropped (player_fid, dropped_at, last_error) VALUES (?, ?, ?)",
+                      (player_fid, time.time(), last_error))
+            c.execute("UPDATE registrations SET verification_pending = 0 WHERE player_fid = ?", (player_fid,))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error dropping verification for FID {player_fid}: {e}", exc_info=True)
+        return False
+
+def _apply_player_verification(c: sqlite3.Cursor, player_fid: int, chief_name: str | None, verified_fc_level: int | None,
+                               verified_fc_display: str | None, kingdom_id: int | None) -> tuple[int, int]:
+    c.execute("""UPDATE registrations SET verified_fc_level = COALESCE(?, verified_fc_level),
+                     verified_fc_display = COALESCE(?, verified_fc_display),
+                     kingdom_id = COALESCE(?, kingdom_id), verification_pending = 0
+                 WHERE player_fid = ?""", (verified_fc_level, verified_fc_display, kingdom_id, player_fid))
+    updated = c.rowcount
+    renamed = 0
+    if chief_name:
+        # The primary key REPLACEs on conflict, so never rename onto another registration's name
+        c.execute("""UPDATE registrations SET chief_name = ?
+                     WHERE player_fid = ? AND chief_name <> ? COLLATE BINARY
+                       AND NOT EXISTS (SELECT 1 FROM registrations other
+                                       WHERE other.event = registrations.event AND other.chief_name = ?
+                                         AND other.rowid <> registrations.rowid)""",
+                  (chief_name, player_fid, chief_name, chief_name))
+        renamed = c.rowcount
+    return updated, renamed
+
+def apply_player_verification(player_fid: int, chief_name: str | None, verified_fc_level: int | None,
+                              verified_fc_display: str | None, kingdom_id: int | None) -> dict | None:
+    """Writes API-verified data to every registration of `player_fid` and removes it from the queue.
+
+    None values leave the stored column unchanged. Returns {'updated', 'renamed'} row counts, or None on error.
+    """
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            updated, renamed = _apply_player_verification(c, player_fid, chief_name, verified_fc_level, verified_fc_display, kingdom_id)
+            c.execute("DELETE FROM verification_queue WHERE player_fid = ?", (player_fid,))
+            conn.commit()
+        return {'updated': updated, 'renamed': renamed}
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error applying verification for FID {player_fid}: {e}", exc_info=True)
+        return None
+
+def apply_player_verifications(updates: list[dict]) -> dict | None:
+    """apply_player_verification for many FIDs in a single transaction.
+
+    Each item has the keyword arguments of apply_player_verification. Returns
+    summed {'updated', 'renamed'} row counts, or None (nothing written) on error.
+    """
+    totals = {'updated': 0, 'renamed': 0}
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            for update in updates:
+                updated, renamed = _apply_player_verification(c, update['player_fid'], update['chief_name'], update['verified_fc_level'],
+                                                               update['verified_fc_display'], update['kingdom_id'])
+                totals['updated'] += updated
+                totals['renamed'] += renamed
+            c.executemany("DELETE FROM verification_queue WHERE player_fid = ?", [(update['player_fid'],) for update in updates])
+            conn.commit()
+        return totals
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error applying {len(updates)} verification(s): {e}", exc_info=True)
+        return None
+
+def get_verification_queue_stats() -> dict:
+    """{'queued', 'due', 'next_attempt_at', 'max_attempts', 'pending_registrations'}."""
+    try:
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute("""SELECT COUNT(*), COALESCE(SUM(next_attempt_at <= ?), 0), MIN(next_attempt_at), COALESCE(MAX(attempts), 0)
+                         FROM verification_queue""", (time.time(),))
+            queued, due, next_attempt_at, max_attempts = c.fetchone()
+            c.execute("SELECT COUNT(*) FROM registrations WHERE verification_pending = 1")
+            pending = c.fetchone()[0]
+        return {'queued': queued, 'due': due, 'next_attempt_at': next_attempt_at, 'max_attempts': max_attempts,
+                'pending_registrations': pending}
+    except sqlite3.Error as e:
+        bot_log.error(f"Database error reading verification queue stats: {e}", exc_info=True)
+        return {'queued': 0, 'due': 0, 'next_attempt_at': None, 'max_attempts': 0, 'pending_registrations': 0}
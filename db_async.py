@@ -0,0 +1,140 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import config
+import database
+
+bot_log = logging.getLogger('registration_bot')
+
+# All SQLite work from coroutines is queued onto this executor so a slow disk
+# never blocks the discord.py event loop (heartbeats, other interactions).
+# Sized to the connection pool so every worker can hold a pooled connection.
+_executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix='db_worker')
+
+async def run(func, *args, **kwargs):
+    """Runs a blocking database callable on the DB thread pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _make_async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+    return wrapper
+
+# --- Group-Commit Registration Writes ---
+# During a sign-up burst each registration used to be its own transaction and
+# fsync. Writes queued here are collected for DB_WRITE_BATCH_WINDOW seconds and
+# committed together by database.register_players_batch; every caller still
+# gets back its own result.
+_pending_registrations = [] # (registration kwargs, future)
+_flush_handle = None
+_flush_lock = None
+_flush_tasks = set() # Strong references; the loop only keeps weak ones, so a flush could be collected mid-commit
+
+async def queue_registration(link_discord_id: int | None = None, **registration) -> dict:
+    """Queues a register_player write (plus optional Discord link) for the next group commit.
+
+    Accepts the same keyword arguments as database.register_player and returns
+    that item's result dict from database.register_players_batch.
+    """
+    global _flush_handle
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    registration['link_discord_id'] = link_discord_id
+    _pending_registrations.append((registration, future))
+
+    if len(_pending_registrations) >= config.DB_WRITE_BATCH_MAX:
+        if _flush_handle is not None:
+            _flush_handle.cancel()
+            _flush_handle = None
+        _start_flush()
+    elif _flush_handle is None:
+        _flush_handle = loop.call_later(config.DB_WRITE_BATCH_WINDOW, _start_flush)
+    return await future
+
+def _start_flush():
+    task = asyncio.create_task(_flush_registrations())
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+
+async def _flush_registrations():
+    global _flush_handle, _flush_lock
+    _flush_handle = None
+    if not _pending_registrations:
+        return
+    batch = _pending_registrations[:]
+    _pending_registrations.clear()
+
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    # Batches commit one at a time so a later write for the same chief never lands before an earlier one
+    async with _flush_lock:
+        try:
+            results = await run(database.register_players_batch, [reg for reg, _ in batch])
+            bot_log.debug(f"Group-committed {len(batch)} registration write(s).")
+        except Exception as e:
+            bot_log.error(f"Unexpected error group-committing {len(batch)} registration(s): {e}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+    for (_, future), result in zip(batch, results):
+        if not future.done():
+            future.set_result(result)
+
+def shutdown():
+    _executor.shutdown(wait=True)
+    bot_log.info("Database worker pool shut down.")
+
+
+# --- Awaitable versions of every database.* query ---
+initialize_databases = _make_async(database.initialize_databases)
+register_player = _make_async(database.register_player)
+unregister_player = _make_async(database.unregister_player)
+is_registered = _make_async(database.is_registered)
+get_registration_count = _make_async(database.get_registration_count)
+get_all_registrations = _make_async(database.get_all_registrations)
+get_registration_counts = _make_async(database.get_registration_counts)
+link_discord_fid = _make_async(database.link_discord_fid)
+unlink_discord_fid = _make_async(database.unlink_discord_fid)
+get_linked_fid = _make_async(database.get_linked_fid)
+get_linked_discord_user = _make_async(database.get_linked_discord_user)
+get_user_registrations = _make_async(database.get_user_registrations)
+get_registration_by_fid_event = _make_async(database.get_registration_by_fid_event)
+get_registration_by_chief_name_event = _make_async(database.get_registration_by_chief_name_event)
+get_registration_by_chief_name_event_slot = _make_async(database.get_registration_by_chief_name_event_slot)
+get_registration_by_user_event_slot_team = _make_async(database.get_registration_by_user_event_slot_team)
+clear_all_registrations = _make_async(database.clear_all_registrations)
+get_registrations_for_export = _make_async(database.get_registrations_for_export)
+get_registrations_for_viewregs = _make_async(database.get_registrations_for_viewregs)
+get_players_for_captain_select = _make_async(database.get_players_for_captain_select)
+get_team_members_for_captain_select = _make_async(database.get_team_members_for_captain_select)
+update_captain_status = _make_async(database.update_captain_status)
+get_registration_by_chief_name_event_slot_team = _make_async(database.get_registration_by_chief_name_event_slot_team)
+clear_other_captains_in_team = _make_async(database.clear_other_captains_in_team)
+clear_team_assignments_and_captains = _make_async(database.clear_team_assignments_and_captains)
+update_player_team_assignment = _make_async(database.update_player_team_assignment)
+update_player_captain_status = _make_async(database.update_player_captain_status)
+get_assignable_players = _make_async(database.get_assignable_players)
+get_unassignable_players_names = _make_async(database.get_unassignable_players_names)
+get_fids_for_reverify = _make_async(database.get_fids_for_reverify)
+add_fuel_manager_role = _make_async(database.add_fuel_manager_role)
+remove_fuel_manager_role = _make_async(database.remove_fuel_manager_role)
+get_fuel_managers = _make_async(database.get_fuel_managers)
+get_lookup_entries = _make_async(database.get_lookup_entries)
+replace_lookup_entries = _make_async(database.replace_lookup_entries)
+add_lookup_entry = _make_async(database.add_lookup_entry)
+remove_lookup_entry = _make_async(database.remove_lookup_entry)
+search_lookup_candidates = _make_async(database.search_lookup_candidates)
+get_cached_player_response = _make_async(database.get_cached_player_response)
+store_cached_player_response = _make_async(database.store_cached_player_response)
+delete_cached_player_response = _make_async(database.delete_cached_player_response)
+get_due_verifications = _make_async(database.get_due_verifications)
+reschedule_verification = _make_async(database.reschedule_verification)
+drop_verification = _make_async(database.drop_verification)
+apply_player_verification = _make_async(database.apply_player_verification)
+apply_player_verifications = _make_async(database.apply_player_verifications)
+get_verification_queue_stats = _make_async(database.get_verification_queue_stats)
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from aiohttp import web
+
+bot_log = logging.getLogger('registration_bot')
+
+# Stand-in for config.API_PLAYER_URL, for exercising and load-testing the bot
+# offline. Checks the md5 sign/time scheme the same way registration._fetch_player
+# builds it and answers with deterministic synthetic players. Latency, 5xx
+# errors, unknown players, an upstream rate limit and periodic 429 bursts can be
+# injected at startup or changed while running via GET/POST /_faults.
+#
+#   python fake_player_api.py --secret test --latency 0.2 --error-rate 0.05
+#   API_PLAYER_URL=http://127.0.0.1:8080/api/player API_SECRET=test python bot.py
+
+DEFAULT_FAULTS = {
+    'latency': 0.05, # Seconds added to every response
+    'jitter': 0.02, # Up to this many extra seconds, uniformly random
+    'error_rate': 0.0, # Share of requests answered 503
+    'unknown_rate': 0.0, # Share of FIDs that don't exist (code 1, "role not exist.")
+    'rate_limit': 0.0, # Requests per second accepted before 429s; 0 = unlimited
+    'burst_every': 0.0, # Every this many seconds...
+    'burst_length': 0.0, # ...answer everything 429 for this many seconds; 0 = never
+    'retry_after': 1.0, # Retry-After sent with 429s; negative = omit the header
+}
+MAX_CLOCK_SKEW_MS = 5 * 60 * 1000
+
+def synthetic_player(fid: int) -> dict:
+    """The same made-up player for a FID on every call."""
+    rng = random.Random(fid)
+    stove_lv = rng.randint(1, 60) # 31+ are FC levels, see registration.get_display_level
+    return {'fid': fid, 'nickname': f"Chief{fid}", 'kid': rng.randint(1, 400), 'stove_lv': stove_lv,
+            'stove_lv_content': stove_lv, 'avatar_image': f"https://example.invalid/avatars/{fid % 100}.png",
+            'total_recharge_amount': 0}
+
+
+class FakePlayerAPI:
+    def __init__(self, secret: str, **faults):
+        self.secret = secret
+        self.faults = {**DEFAULT_FAULTS, **faults}
+        self.started_at = time.monotonic()
+        self.rate_tokens = self.faults['rate_limit'] # Starts full, like a real limiter's bucket
+        self.rate_updated_at = time.monotonic()
+        self.stats = {'requests': 0, 'ok': 0, 'unknown': 0, 'bad_sign': 0, 'bad_request': 0, 'errors': 0, 'rate_limited': 0}
+
+    def _rate_limited(self, now: float) -> bool:
+        if self.faults['burst_every'] > 0 and self.faults['burst_length'] > 0:
+            if (now - self.started_at) % self.faults['burst_every'] < self.faults['burst_length']:
+                return True
+        rate = self.faults['rate_limit']
+        if rate <= 0:
+            return False
+        self.rate_tokens = min(rate, self.rate_tokens + (now - self.rate_updated_at) * rate)
+        self.rate_updated_at = now
+        if self.rate_tokens < 1:
+            return True
+        self.rate_tokens -= 1
+        return False
+
+    async def handle_player(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        await asyncio.sleep(self.faults['latency'] + random.uniform(0, self.faults['jitter']))
+
+        if self._rate_limited(time.monotonic()):
+            self.stats['rate_limited'] += 1
+            headers = {'Retry-After': f"{self.faults['retry_after']:g}"} if self.faults['retry_after'] >= 0 else None
+            return web.json_response({'code': 1, 'msg': 'Too many requests'}, status=429, headers=headers)
+        if random.random() < self.faults['error_rate']:
+            self.stats['errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+
+        form = await request.post()
+        try:
+            fid, time_ms, sign = int(form['fid']), int(form['time']), form['sign']
+        except (KeyError, ValueError):
+            self.stats['bad_request'] += 1
+            return web.json_response({'code': 1, 'msg': 'Params error', 'data': []})
+        expected = hashlib.md5(f"fid={form['fid']}&time={form['time']}{self.secret}".encode('utf-8')).hexdigest()
+        if sign != expected:
+            self.stats['bad_sign'] += 1
+            return web.json_response({'code': 1, 'msg': 'Sign Error', 'data': []})
+        if abs(time.time() * 1000 - time_ms) > MAX_CLOCK_SKEW_MS:
+            self.stats['bad_sign'] += 1
+            return web.json_response({'code': 1, 'msg': 'Time Error', 'data': []})
+
+        if random.Random(fid ^ 0x5eed).random() < self.faults['unknown_rate']:
+            self.stats['unknown'] += 1
+            return web.json_response({'code': 1, 'msg': 'role not exist.', 'err_code': 40004, 'data': []})
+        self.stats['ok'] += 1
+        return web.json_response({'code': 0, 'msg': 'success', 'data': synthetic_player(fid)})
+
+    async def handle_faults(self, request: web.Request) -> web.Response:
+        """GET shows the current faults, POST a JSON object to change some of them."""
+        if request.method == 'POST':
+            changes = await request.json()
+            unknown = set(changes) - set(DEFAULT_FAULTS)
+            if unknown:
+                return web.json_response({'error': f"Unknown fault(s): {', '.join(sorted(unknown))}"}, status=400)
+            self.faults.update({key: float(value) for key, value in changes.items()})
+            bot_log.info(f"Fake player API faults now {self.faults}")
+        return web.json_response(self.faults)
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/player', self.handle_player)
+        app.router.add_route('*', '/_faults', self.handle_faults)
+        app.router.add_get('/_stats', self.handle_stats)
+        return app
+
+async def start_server(fake: FakePlayerAPI, host: str = '127.0.0.1', port: int = 0) -> tuple[web.AppRunner, str]:
+    """Runs `fake` in the current event loop. Returns the runner (call .cleanup() to stop) and the player URL."""
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = runner.addresses[0][1] # port=0 picks a free one
+    return runner, f"http://{host}:{bound_port}/api/player"
+
+def add_fault_arguments(parser):
+    for name, default in DEFAULT_FAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=default)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Fake player API server for offline testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--secret', required=True, help="Must match the bot's API_SECRET")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    fake = FakePlayerAPI(args.secret, **{name: getattr(args, name) for name in DEFAULT_FAULTS})
+    print(f"Serving fake player API on http://{args.host}:{args.port}/api/player")
+    web.run_app(fake.create_app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+import config
+import fake_player_api
+
+# Drives registration.call_player_api at a fixed concurrency and reports
+# end-to-end latency percentiles (including rate-limiter waits) and throughput,
+# plus the HTTP client, rate limiter and circuit breaker counters. Without --url
+# it starts fake_player_api in-process, with the fault options applied.
+#
+#   python load_test.py --requests 2000 --concurrency 50 --rate 50 --burst 50 --latency 0.2 --error-rate 0.02
+#   python load_test.py --url http://127.0.0.1:8080/api/player --secret test
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))] if samples else 0.0
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test call_player_api against a (fake) player API.")
+    parser.add_argument('--url', help="Player API to hit; default starts fake_player_api in-process")
+    parser.add_argument('--secret', default=config.API_SECRET or 'load-test')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--fids', type=int, default=1000, help="Distinct FIDs to cycle through")
+    parser.add_argument('--use-cache', action='store_true', help="Let api_cache answer repeat FIDs")
+    parser.add_argument('--background', action='store_true', help="Call at PRIORITY_BACKGROUND")
+    parser.add_argument('--rate', type=float, default=config.API_RATE_PER_SECOND, help="config.API_RATE_PER_SECOND")
+    parser.add_argument('--burst', type=int, default=config.API_RATE_BURST, help="config.API_RATE_BURST")
+    parser.add_argument('--timeout', type=float, default=config.HTTP_TIMEOUT_TOTAL, help="config.HTTP_TIMEOUT_TOTAL")
+    parser.add_argument('--pool-per-host', type=int, default=config.HTTP_POOL_LIMIT_PER_HOST, help="config.HTTP_POOL_LIMIT_PER_HOST")
+    parser.add_argument('--db', help="SQLite file for the response cache; default a temporary file")
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's per-call warnings and errors")
+    fake_player_api.add_fault_arguments(parser.add_argument_group('fake server faults (in-process server only)'))
+    return parser.parse_args()
+
+def apply_config(args: argparse.Namespace, url: str):
+    """Must run before registration is imported: its limiter and breaker read config at import."""
+    config.API_PLAYER_URL = url
+    config.API_SECRET = args.secret
+    config.API_RATE_PER_SECOND = args.rate
+    config.API_RATE_BURST = args.burst
+    config.HTTP_TIMEOUT_TOTAL = args.timeout
+    config.HTTP_POOL_LIMIT_PER_HOST = args.pool_per_host
+    config.DB_MAIN_FILE = args.db or os.path.join(tempfile.mkdtemp(prefix='load_test_'), 'load_test.db')
+
+async def run(args: argparse.Namespace):
+    fake = runner = None
+    url = args.url
+    if url is None:
+        fake = fake_player_api.FakePlayerAPI(args.secret, **{name: getattr(args, name) for name in fake_player_api.DEFAULT_FAULTS})
+        runner, url = await fake_player_api.start_server(fake)
+    apply_config(args, url)
+
+    import api
+    import database
+    import rate_limiter
+    import registration
+    database.initialize_databases()
+    priority = rate_limiter.PRIORITY_BACKGROUND if args.background else rate_limiter.PRIORITY_INTERACTIVE
+
+    latencies = []
+    outcomes = Counter()
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < args.requests:
+            fid = 100_000_000 + issued % args.fids
+            issued += 1
+            started = time.perf_counter()
+            result = await registration.call_player_api(None, fid, use_cache=args.use_cache, priority=priority)
+            latencies.append(time.perf_counter() - started)
+            outcomes[(result.get('error') or 'ok') if result else 'no_response'] += 1
+
+    print(f"Load test: {args.requests} calls, concurrency {args.concurrency}, {args.fids} FIDs -> {url}")
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        report(elapsed, sorted(latencies), outcomes, api.get_stats(), registration.api_limiter.get_stats(),
+               registration.api_breaker.get_stats(), registration.get_single_flight_stats(), fake.stats if fake else None)
+    finally:
+        await api.close_client_session()
+        if runner is not None:
+            await runner.cleanup()
+        database.close_all_connections()
+
+def report(elapsed: float, samples: list[float], outcomes: Counter, http: dict, limiter: dict, breaker: dict, flights: dict, server: dict | None):
+    ms = lambda seconds: f"{seconds * 1000:.1f}ms"
+    print(f"\nCompleted {len(samples)} calls in {elapsed:.2f}s: {len(samples) / elapsed:.1f} calls/s")
+    print(f"call_player_api latency  p50 {ms(_percentile(samples, 0.50))}  p95 {ms(_percentile(samples, 0.95))}  "
+          f"p99 {ms(_percentile(samples, 0.99))}  max {ms(samples[-1] if samples else 0.0)}")
+    print("Outcomes: " + ", ".join(f"{name} {count}" for name, count in outcomes.most_common()))
+    print(f"HTTP: {http['requests']} requests ({http['failed']} failed), latency p50 {http['latency_p50_ms']:.1f}ms "
+          f"p95 {http['latency_p95_ms']:.1f}ms p99 {http['latency_p99_ms']:.1f}ms | connections created {http['connections_created']}, "
+          f"reused {http['connections_reused']} | pool waits {http['pool_waits']} ({http['pool_wait_seconds']:.2f}s)")
+    print(f"Rate limiter: rate {limiter['rate']:.2f}/s (base {limiter['base_rate']:.2f}/s), granted {limiter['granted']}, "
+          f"waited {limiter['waited']}, gave up {limiter['gave_up']}, 429s {limiter['rate_limited']}")
+    print(f"Circuit breaker: {breaker['state']}, opened {breaker['opened']}x, refused {breaker['rejected']} | "
+          f"single flight: {flights['fetches']} fetches, {flights['coalesced']} coalesced")
+    if server:
+        print("Fake server: " + ", ".join(f"{name} {count}" for name, count in server.items()))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not args.verbose:
+        logging.getLogger('registration_bot').setLevel(logging.CRITICAL) # Injected faults would log every call
+    asyncio.run(run(args))
@@ -1,78 +1,711 @@
-import pandas as pd
-from thefuzz import process
+import asyncio
+import csv
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from thefuzz import fuzz, process, utils as fuzz_utils
 import logging
 import os
+import config
+import database
+import db_async
 
 bot_log = logging.getLogger('registration_bot')
 
-LOOKUP_FILE = 'alliance_lookup.csv'
-lookup_data = pd.DataFrame(columns=['Chief Name', 'FID'])
+LOOKUP_FILE = config.FID_LOOKUP_CSV
+JOURNAL_FILE = config.FID_LOOKUP_JOURNAL
+NAME_COLUMNS = ('ChiefName', 'Chief Name') # Header written by officers / by older versions of this module
+FID_COLUMN = 'FID'
 
-def load_lookup_data():
-    global lookup_data
-    if os.path.exists(LOOKUP_FILE):
-        try:
-            lookup_data = pd.read_csv(LOOKUP_FILE)
-            bot_log.info(f"Successfully loaded {len(lookup_data)} entries from {LOOKUP_FILE}")
-            return len(lookup_data)
-        except Exception as e:
-            bot_log.error(f"Error loading lookup data from {LOOKUP_FILE}: {e}")
-            lookup_data = pd.DataFrame(columns=['Chief Name', 'FID']) # Reset on error
-            return 0
-    else:
+
+_DECORATION_PREFIX_RE = re.compile(r'^[\W_]*(?:itz|its)[\W_]+') # e.g. "-Itz___MoeBear"
+_SEPARATOR_RE = re.compile(r'[\W_]+')
+
+def normalize_name(chief_name: str) -> str:
+    """Key that ignores case, Unicode width/compatibility forms and name decorations.
+
+    "-Itz___MoeBear", "moe_bear" and "ＭｏｅＢｅａｒ" all normalize to "moebear".
+    """
+    key = unicodedata.normalize('NFKC', str(chief_name)).casefold().strip()
+    key = _DECORATION_PREFIX_RE.sub('', key)
+    return _SEPARATOR_RE.sub('', key) or key
+
+
+def name_trigrams(chief_name: str) -> set[str]:
+    """Character trigrams of each token, padded so short names and word edges still produce grams.
+
+    Uses the same normalization as token_sort_ratio (lowercase, punctuation to
+    spaces) and ignores token order, like the scorer does.
+    """
+    grams = set()
+    for token in fuzz_utils.full_process(chief_name).split():
+        padded = f" {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class RosterMap:
+    """Name<->FID maps with the roster's uniqueness rules and nothing else.
+
+    Name keys are case-folded so lookups are case-insensitive; the canonical
+    spelling is kept in fid_to_name. Cheap to build, e.g. to diff a changed CSV.
+    """
+    def __init__(self):
+        self.name_to_fid: dict[str, int] = {}
+        self.fid_to_name: dict[int, str] = {}
+
+    def __len__(self):
+        return len(self.fid_to_name)
+
+    def add(self, chief_name: str, fid: int) -> bool:
+        key = chief_name.casefold()
+        if key in self.name_to_fid or fid in self.fid_to_name:
+            return False
+        self.name_to_fid[key] = fid
+        self.fid_to_name[fid] = chief_name
+        return True
+
+    def remove(self, fid: int) -> str | None:
+        """Removes the entry for `fid`; returns its name, or None if it wasn't present."""
+        chief_name = self.fid_to_name.pop(fid, None)
+        if chief_name is not None:
+            del self.name_to_fid[chief_name.casefold()]
+        return chief_name
+
+    def entries(self) -> list[tuple[str, int]]:
+        return [(name, fid) for fid, name in self.fid_to_name.items()]
+
+
+class LookupIndex(RosterMap):
+    """In-memory roster with O(1) name->FID and FID->name lookups plus search structures.
+
+    A trigram inverted index (trigram -> FIDs) narrows fuzzy matching down to
+    names that share n-grams with the query.
+    """
+    def __init__(self):
+        super().__init__()
+        self.trigram_postings: dict[str, set[int]] = {}
+        self.normalized_to_fids: dict[str, list[int]] = {}
+        self.sorted_keys: list[str] = [] # Sorted normalized keys for prefix search
+
+    def add(self, chief_name: str, fid: int) -> bool:
+        if not super().add(chief_name, fid):
+            return False
+        for gram in name_trigrams(chief_name):
+            self.trigram_postings.setdefault(gram, set()).add(fid)
+        normalized = normalize_name(chief_name)
+        if normalized not in self.normalized_to_fids:
+            self.normalized_to_fids[normalized] = []
+            insort(self.sorted_keys, normalized)
+        self.normalized_to_fids[normalized].append(fid)
+        return True
+
+    def remove(self, fid: int) -> str | None:
+        chief_name = super().remove(fid)
+        if chief_name is None:
+            return None
+        for gram in name_trigrams(chief_name):
+            postings = self.trigram_postings.get(gram)
+            if postings is not None:
+                postings.discard(fid)
+                if not postings:
+                    del self.trigram_postings[gram]
+        normalized = normalize_name(chief_name)
+        fids = self.normalized_to_fids[normalized]
+        fids.remove(fid)
+        if not fids:
+            del self.normalized_to_fids[normalized]
+            del self.sorted_keys[bisect_left(self.sorted_keys, normalized)]
+        return chief_name
+
+    def fids_by_normalized(self, chief_name: str) -> list[int]:
+        return self.normalized_to_fids.get(normalize_name(chief_name), [])
+
+    def fids_by_prefix(self, chief_name: str, max_results: int) -> list[int]:
+        """FIDs whose normalized name starts with the normalized query (at most max_results + 1, to detect overflow)."""
+        prefix = normalize_name(chief_name)
+        fids = []
+        i = bisect_left(self.sorted_keys, prefix)
+        while i < len(self.sorted_keys) and self.sorted_keys[i].startswith(prefix) and len(fids) <= max_results:
+            fids.extend(self.normalized_to_fids[self.sorted_keys[i]])
+            i += 1
+        return fids
+
+    async def candidate_names(self, query: str, max_candidates: int) -> list[str]:
+        """Names sharing the most trigrams with `query`, at most `max_candidates` of them.
+
+        Small rosters are returned whole so scoring is identical to a full scan.
+        Async so subclasses can fetch candidates off the event loop.
+        """
+        if len(self.fid_to_name) <= max_candidates:
+            return self.names()
+        shared = Counter()
+        for gram in name_trigrams(query):
+            shared.update(self.trigram_postings.get(gram, ()))
+        return [self.fid_to_name[fid] for fid, _ in shared.most_common(max_candidates)]
+
+    def get_fid(self, chief_name: str) -> int | None:
+        return self.name_to_fid.get(chief_name.strip().casefold())
+
+    def get_name(self, fid: int) -> str | None:
+        return self.fid_to_name.get(fid)
+
+    def names(self) -> list[str]:
+        return list(self.fid_to_name.values())
+
+
+class SqliteLookupIndex(LookupIndex):
+    """LookupIndex loaded from the fid_lookup table that gets fuzzy candidates from its FTS5 trigram index."""
+    async def candidate_names(self, query: str, max_candidates: int) -> list[str]:
+        if len(self.fid_to_name) <= max_candidates:
+            return self.names()
+        folded = query.casefold()
+        grams = sorted({folded[i:i + 3] for i in range(len(folded) - 2)})
+        found = await db_async.search_lookup_candidates(grams, max_candidates)
+        if found is None: # Query too short for trigrams, or no FTS5
+            return await super().candidate_names(query, max_candidates)
+        return [name for name in found if self.get_fid(name) is not None]
+
+
+class FuzzyResultCache:
+    """Bounded LRU of ranked (name, fid, score) lists, keyed by normalized query.
+
+    Entries belong to one roster version; when the version changes (reload or
+    add) the whole cache is dropped on the next access.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version: int):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, version: int, matches: list):
+        if version != self.version or self.max_size <= 0:
+            return
+        self.entries[key] = matches
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+
+_index = LookupIndex()
+_name_column = NAME_COLUMNS[0]
+_roster_version = 0 # Bumped whenever the roster changes; invalidates _fuzzy_cache
+_fuzzy_cache = FuzzyResultCache(config.FUZZY_CACHE_SIZE)
+_journal_entries = 0 # Records appended to JOURNAL_FILE since the last compaction
+_journal_generation = 0 # Bumped each time the journal is truncated by compaction
+_journal_lock = asyncio.Lock() # Serializes journal appends and compaction, which run in worker threads
+_csv_signature = None # (mtime_ns, size) of LOOKUP_FILE as the live roster last read or wrote it
+_loaded = asyncio.Event() # Set once the first load finished (even if it found no roster)
+
+
+def _bump_roster_version():
+    global _roster_version
+    _roster_version += 1
+
+def _query_key(chief_name: str) -> str:
+    # token_sort_ratio lowercases and ignores token order/spacing, so neither can change the ranking
+    return ' '.join(chief_name.casefold().split())
+
+def get_roster_version() -> int:
+    """Changes whenever the roster does; lets callers cache work derived from it."""
+    return _roster_version
+
+def get_fuzzy_cache_stats() -> dict:
+    return _fuzzy_cache.stats()
+
+async def wait_until_loaded():
+    """Returns once the startup load has finished, so names aren't resolved against an empty roster."""
+    await _loaded.wait()
+
+
+def _parse_fid(value) -> int | None:
+    try:
+        fid = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return fid if fid > 0 else None
+
+def _read_lookup_csv(path: str, roster_type: type[RosterMap] = LookupIndex) -> tuple[RosterMap, str]:
+    index = roster_type()
+    name_column = NAME_COLUMNS[0]
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for column in NAME_COLUMNS:
+            if reader.fieldnames and column in reader.fieldnames:
+                name_column = column
+                break
+        for row in reader:
+            chief_name = (row.get(name_column) or '').strip()
+            fid = _parse_fid(row.get(FID_COLUMN))
+            if not chief_name or fid is None:
+                bot_log.warning(f"Skipping malformed lookup row in {path}: {row}")
+                continue
+            if not index.add(chief_name, fid):
+                bot_log.warning(f"Skipping duplicate lookup entry in {path}: '{chief_name}' -> {fid}")
+    return index, name_column
+
+# --- Change Journal ---
+# Adds/removes are appended to JOURNAL_FILE (one CSV record: op, name, FID)
+# instead of rewriting the whole lookup CSV. On load the journal is replayed
+# over the base CSV; compaction folds it back in with an atomic replace.
+# Replaying is idempotent, so a crash between replace and truncate is harmless.
+JOURNAL_ADD = '+'
+JOURNAL_REMOVE = '-'
+
+def _replay_journal(index: RosterMap, path: str, start: int = 0) -> tuple[int, int]:
+    """Applies journal records from byte offset `start` to `index`.
+
+    Returns (records read, offset just past the last complete record).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+        # No trailing newline: the last append was torn by a crash (or is still being written)
+        bot_log.warning(f"Ignoring incomplete trailing record in {path}: {data[end:]!r}")
+    records = 0
+    for row in csv.reader(data[:end].decode('utf-8').splitlines()):
+        if len(row) != 3 or row[0] not in (JOURNAL_ADD, JOURNAL_REMOVE) or _parse_fid(row[2]) is None:
+            bot_log.warning(f"Skipping malformed journal record in {path}: {row}")
+            continue
+        op, chief_name, fid = row[0], row[1].strip(), _parse_fid(row[2])
+        if op == JOURNAL_ADD:
+            index.add(chief_name, fid)
+        else:
+            index.remove(fid)
+        records += 1
+    return records, start + end
+
+def _append_journal(op: str, chief_name: str, fid: int):
+    with open(JOURNAL_FILE, 'a', newline='', encoding='utf-8') as f:
+        csv.writer(f, lineterminator='\n').writerow([op, chief_name, fid])
+        f.flush()
+        os.fsync(f.fileno())
+
+def _fsync_directory(path: str):
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return # Not supported on this platform (e.g. Windows)
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+def file_signature(path: str) -> tuple[int, int] | None:
+    """(mtime_ns, size) of `path`, or None if it is missing. lookup_watcher polls the same signature."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _compact_journal(name_column: str, entries: list[tuple[str, int]]) -> bool:
+    """Worker-thread part of compact_lookup_journal: writes the `entries` snapshot, then truncates the journal."""
+    global _journal_generation
+    if file_signature(LOOKUP_FILE) != _csv_signature:
+        bot_log.info(f"{LOOKUP_FILE} changed on disk since it was loaded; postponing journal compaction until it is reloaded.")
+        return False
+    if not _save_entries(name_column, entries):
+        return False
+    # Bumped before truncating, so a _build_current that could read the emptied journal always rebuilds
+    _journal_generation += 1
+    try:
+        with open(JOURNAL_FILE, 'w', encoding='utf-8') as f:
+            os.fsync(f.fileno())
+    except OSError as e:
+        bot_log.error(f"Error truncating lookup journal {JOURNAL_FILE}: {e}")
+        return False
+    return True
+
+async def compact_lookup_journal() -> bool:
+    """Writes the current roster to the base CSV atomically, then empties the journal.
+
+    The file work runs in a worker thread on a snapshot of the roster. Skipped
+    (returns False) if the CSV changed on disk since the roster was loaded
+    from it: rewriting it from memory would discard that edit. The journal is
+    kept, so the watcher's sync replays it over the edited file.
+    """
+    global _journal_entries
+    async with _journal_lock:
+        if not await asyncio.to_thread(_compact_journal, _name_column, _index.entries()):
+            return False
+        bot_log.info(f"Compacted {_journal_entries} journal record(s) into {LOOKUP_FILE}.")
+        _journal_entries = 0
+    return True
+
+def _sqlite_backend() -> bool:
+    return config.LOOKUP_BACKEND == 'sqlite'
+
+def _index_type() -> type[LookupIndex]:
+    return SqliteLookupIndex if _sqlite_backend() else LookupIndex
+
+def _lookup_source() -> str:
+    return f"'fid_lookup' in {config.DB_MAIN_FILE}" if _sqlite_backend() else LOOKUP_FILE
+
+def _attach(bot):
+    if bot is not None:
+        bot.fid_lookup_data = _index.fid_to_name
+
+def _build_index(roster_type: type[RosterMap] | None = None) -> tuple[RosterMap, str, int, int, tuple[int, int] | None]:
+    """Builds a fresh roster from the base CSV plus journal (or the lookup table) without touching the live one.
+
+    Safe to run in a worker thread. Raises FileNotFoundError if the CSV is missing,
+    RuntimeError if the lookup table can't be read.
+    Returns (index, name column, journal records replayed, journal offset reached, CSV signature).
+    """
+    roster_type = roster_type or _index_type()
+    if _sqlite_backend():
+        entries = database.get_lookup_entries()
+        if entries is None:
+            raise RuntimeError(f"could not read {_lookup_source()}") # Installing an empty roster would wipe every lookup
+        index = roster_type()
+        for chief_name, fid in entries:
+            index.add(chief_name, fid)
+        return index, NAME_COLUMNS[0], 0, 0, None
+
+    # Taken before reading: an edit landing mid-read then looks like a change, never like the version we read
+    signature = file_signature(LOOKUP_FILE)
+    index, name_column = _read_lookup_csv(LOOKUP_FILE, roster_type)
+    records, offset = 0, 0
+    if os.path.exists(JOURNAL_FILE):
+        records, offset = _replay_journal(index, JOURNAL_FILE)
+    return index, name_column, records, offset, signature
+
+def diff_rosters(old: dict[int, str], new: dict[int, str]) -> tuple[dict[int, str], dict[int, str], dict[int, str]]:
+    """Compares two FID->name maps. Returns (added, removed, renamed) FID->name maps, names taken from the side they exist on."""
+    added = {fid: name for fid, name in new.items() if fid not in old}
+    removed = {fid: name for fid, name in old.items() if fid not in new}
+    renamed = {fid: name for fid, name in new.items() if fid in old and old[fid] != name}
+    return added, removed, renamed
+
+def _install_index(bot, index: LookupIndex, name_column: str, journal_records: int, signature: tuple[int, int] | None):
+    global _index, _name_column, _journal_entries, _csv_signature
+    _index = index # Single reference swap; callers already running keep the snapshot they read
+    _name_column = name_column
+    _journal_entries = journal_records
+    _csv_signature = signature
+    _bump_roster_version()
+    _attach(bot)
+    _loaded.set()
+
+async def _build_current(roster_type: type[RosterMap]) -> tuple[RosterMap, str, int, tuple[int, int] | None]:
+    """Runs _build_index in a worker thread and brings the result up to date with the journal."""
+    while True:
+        generation = _journal_generation
+        index, name_column, records, offset, signature = await asyncio.to_thread(_build_index, roster_type)
+        if generation == _journal_generation:
+            break
+        # The journal was compacted into the CSV mid-build; the CSV we read may predate it
+        bot_log.info("Lookup journal was compacted during rebuild; rebuilding.")
+
+    # Adds/removes journaled on the loop while the worker was building
+    if not _sqlite_backend() and os.path.exists(JOURNAL_FILE):
+        caught_up, _ = _replay_journal(index, JOURNAL_FILE, offset)
+        records += caught_up
+    return index, name_column, records, signature
+
+async def reload_lookup_data(bot) -> dict:
+    """Rebuilds the index in a worker thread, then swaps it in on the event loop.
+
+    Lookups keep using the old index until the swap. The previous index is kept
+    if the CSV is missing (FileNotFoundError) or can't be parsed. Returns a
+    report with entry counts, added/removed/renamed counts and build_seconds.
+    """
+    started = time.perf_counter()
+    index, name_column, records, signature = await _build_current(_index_type())
+    build_seconds = time.perf_counter() - started
+
+    added, removed, renamed = diff_rosters(_index.fid_to_name, index.fid_to_name)
+    previous_count = len(_index)
+    _install_index(bot, index, name_column, records, signature)
+    bot_log.info(f"Reloaded lookup data in {build_seconds:.3f}s: {len(index)} entries "
+                 f"(+{len(added)} / -{len(removed)} / ~{len(renamed)}).")
+    return {'entries': len(index), 'previous_entries': previous_count, 'added': len(added),
+            'removed': len(removed), 'renamed': len(renamed), 'build_seconds': build_seconds}
+
+async def load_lookup_data_async(bot) -> int:
+    """Startup load: builds the roster in a worker thread and installs it on the event loop."""
+    try:
+        index, name_column, records, signature = await _build_current(_index_type())
+    except FileNotFoundError:
         bot_log.warning(f"{LOOKUP_FILE} not found. Starting with empty lookup data.")
-        lookup_data = pd.DataFrame(columns=['Chief Name', 'FID'])
-        return 0
+        _loaded.set()
+        return len(_index)
+    except Exception as e:
+        bot_log.error(f"Error loading lookup data from {_lookup_source()}: {e}")
+        _loaded.set()
+        return len(_index)
+    _install_index(bot, index, name_column, records, signature)
+    bot_log.info(f"Successfully loaded {len(index)} entries from {_lookup_source()}")
+    if _sqlite_backend() and not len(index) and os.path.exists(LOOKUP_FILE):
+        bot_log.warning(f"Lookup table is empty; import {LOOKUP_FILE} with `python lookup.py import`.")
+    return len(index)
+
+async def sync_lookup_file(bot) -> dict:
+    """Applies only the difference between the lookup CSV (plus journal) and the live index.
+
+    Used when the CSV was edited outside the bot. The file is parsed into a
+    plain RosterMap in a worker thread; the live index is then patched in place,
+    so search structures are only rebuilt for the names that actually changed.
+    Raises FileNotFoundError if the CSV is missing, leaving the roster untouched.
+    """
+    global _name_column, _journal_entries, _csv_signature
+    roster, name_column, records, signature = await _build_current(RosterMap)
+    added, removed, renamed = diff_rosters(_index.fid_to_name, roster.fid_to_name)
 
-def save_lookup_data():
-    global lookup_data
+    for fid in (*removed, *renamed):
+        _index.remove(fid)
+    for fid, chief_name in (*renamed.items(), *added.items()):
+        if not _index.add(chief_name, fid):
+            bot_log.warning(f"Could not apply lookup change '{chief_name}' -> {fid}; name or FID already in use.")
+
+    _name_column = name_column
+    _journal_entries = records
+    _csv_signature = signature
+    if added or removed or renamed:
+        _bump_roster_version()
+        _attach(bot)
+        bot_log.info(f"Applied {LOOKUP_FILE} changes: +{len(added)} / -{len(removed)} / ~{len(renamed)} "
+                     f"({len(_index)} entries).")
+    return {'entries': len(_index), 'added': len(added), 'removed': len(removed), 'renamed': len(renamed)}
+
+def _write_lookup_csv(path: str, name_column: str, entries: list[tuple[str, int]]) -> bool:
+    """Writes a lookup CSV via a temp file + os.replace, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
     try:
-        lookup_data.to_csv(LOOKUP_FILE, index=False)
-        bot_log.info(f"Successfully saved {len(lookup_data)} entries to {LOOKUP_FILE}")
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([name_column, FID_COLUMN])
+            writer.writerows(entries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(path)
+        bot_log.info(f"Successfully saved {len(entries)} entries to {path}")
+        return True
     except Exception as e:
-        bot_log.error(f"Error saving lookup data to {LOOKUP_FILE}: {e}")
+        bot_log.error(f"Error saving lookup data to {path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+def _save_entries(name_column: str, entries: list[tuple[str, int]]) -> bool:
+    global _csv_signature
+    if not _write_lookup_csv(LOOKUP_FILE, name_column, entries):
+        return False
+    _csv_signature = file_signature(LOOKUP_FILE)
+    return True
 
-def add_lookup_entry(chief_name, fid):
-    global lookup_data
+async def save_lookup_data() -> bool:
+    """Rewrites the lookup CSV from a snapshot of the roster, in a worker thread."""
+    return await asyncio.to_thread(_save_entries, _name_column, _index.entries())
+
+def import_lookup_csv(path: str = LOOKUP_FILE) -> int | None:
+    """One-shot import of a lookup CSV (plus its pending journal) into the fid_lookup table.
+
+    Replaces the table contents. Returns the number of entries imported, or None on a DB error.
+    """
+    roster, _ = _read_lookup_csv(path, RosterMap)
+    if os.path.abspath(path) == os.path.abspath(LOOKUP_FILE) and os.path.exists(JOURNAL_FILE):
+        _replay_journal(roster, JOURNAL_FILE)
+    if not database.replace_lookup_entries(roster.entries()):
+        return None
+    bot_log.info(f"Imported {len(roster)} lookup entries from {path} into {_lookup_source()}.")
+    return len(roster)
+
+def export_lookup_csv(path: str = LOOKUP_FILE) -> int | None:
+    """Writes the fid_lookup table out as a lookup CSV. Returns the number of entries, or None on failure."""
+    entries = database.get_lookup_entries()
+    if entries is None:
+        return None
+    entries = sorted(entries, key=lambda entry: entry[0].casefold())
+    return len(entries) if _write_lookup_csv(path, NAME_COLUMNS[0], entries) else None
+
+async def _persist_change(op: str, chief_name: str, fid: int) -> bool:
+    global _journal_entries
+    if _sqlite_backend():
+        if op == JOURNAL_ADD:
+            return await db_async.add_lookup_entry(chief_name, fid)
+        return await db_async.remove_lookup_entry(fid)
+    async with _journal_lock:
+        try:
+            await asyncio.to_thread(_append_journal, op, chief_name, fid)
+        except OSError as e:
+            bot_log.error(f"Error journaling lookup change {op} '{chief_name}' -> '{fid}': {e}. Rewriting {LOOKUP_FILE} instead.")
+            return await save_lookup_data()
+        _journal_entries += 1
+    if _journal_entries >= config.LOOKUP_JOURNAL_COMPACT_THRESHOLD:
+        await compact_lookup_journal()
+    return True
+
+async def add_lookup_entry(bot, chief_name, fid):
     chief_name = str(chief_name).strip()
-    fid = str(fid).strip()
+    fid = _parse_fid(fid)
+    if not chief_name or fid is None:
+        bot_log.warning(f"Invalid lookup entry: Chief Name '{chief_name}', FID '{fid}'.")
+        return False
 
-    if chief_name in lookup_data['Chief Name'].values or fid in lookup_data['FID'].values:
+    index = _index # Undo on this one even if a reload swaps the roster while persisting
+    if not index.add(chief_name, fid):
         bot_log.warning(f"Lookup entry for Chief Name '{chief_name}' or FID '{fid}' already exists.")
         return False
 
-    new_entry = pd.DataFrame([{'Chief Name': chief_name, 'FID': fid}])
-    lookup_data = pd.concat([lookup_data, new_entry], ignore_index=True)
-    save_lookup_data()
+    _bump_roster_version()
+    if not await _persist_change(JOURNAL_ADD, chief_name, fid):
+        index.remove(fid)
+        return False
+    _attach(bot)
     bot_log.info(f"Added new lookup entry: '{chief_name}' -> '{fid}'")
     return True
 
-def find_lookup_entry(chief_name, limit=5):
-    global lookup_data
-    chief_name = str(chief_name).strip()
+async def remove_lookup_entry(bot, fid):
+    fid = _parse_fid(fid)
+    index = _index
+    chief_name = index.remove(fid) if fid is not None else None
+    if chief_name is None:
+        bot_log.warning(f"No lookup entry found for FID '{fid}'.")
+        return False
+
+    _bump_roster_version()
+    if not await _persist_change(JOURNAL_REMOVE, chief_name, fid):
+        index.add(chief_name, fid)
+        return False
+    _attach(bot)
+    bot_log.info(f"Removed lookup entry: '{chief_name}' -> '{fid}'")
+    return True
+
+def get_name_by_fid(bot, fid) -> str | None:
+    fid = _parse_fid(fid)
+    return _index.get_name(fid) if fid is not None else None
 
-    if lookup_data.empty:
-        bot_log.info("Lookup data is empty. No search possible.")
+def get_fid_by_name(bot, chief_name) -> int | None:
+    return _index.get_fid(str(chief_name))
+
+def get_lookup_count(bot) -> int:
+    return len(_index)
+
+def get_all_lookup_entries(bot) -> list[tuple[str, int]]:
+    return _index.entries()
+
+async def find_fuzzy_matches(chief_name, limit=config.FUZZY_MATCH_LIMIT, threshold=config.FUZZY_MATCH_THRESHOLD) -> list[tuple[str, int, int]]:
+    """Returns up to `limit` (name, fid, score) tuples scoring at least `threshold`, best first."""
+    chief_name = str(chief_name).strip()
+    index, version = _index, _roster_version # The roster may be swapped while candidates are fetched
+    if not chief_name or not len(index):
         return []
+    cache_key = ('ngram', _query_key(chief_name), limit, threshold)
+    cached = _fuzzy_cache.get(cache_key, version)
+    if cached is not None:
+        return list(cached)
+
+    candidates = await index.candidate_names(chief_name, config.FUZZY_CANDIDATE_LIMIT)
+    matches = process.extract(chief_name, candidates, scorer=fuzz.token_sort_ratio, limit=limit)
+    results = [(name, index.get_fid(name), score) for name, score in matches if score >= threshold]
+    _fuzzy_cache.put(cache_key, version, results)
+    return list(results)
+
+def _full_scan_matches(chief_name: str) -> list[tuple[str, int, int]]:
+    cache_key = ('full', _query_key(chief_name))
+    cached = _fuzzy_cache.get(cache_key, _roster_version)
+    if cached is not None:
+        return list(cached)
+
+    full = process.extract(chief_name, _index.names(), scorer=fuzz.token_sort_ratio, limit=config.FUZZY_MATCH_LIMIT)
+    results = [(name, _index.get_fid(name), score) for name, score in full if score >= config.FUZZY_MATCH_THRESHOLD]
+    _fuzzy_cache.put(cache_key, _roster_version, results)
+    return list(results)
+
+def _scored(chief_name: str, fids: list[int]) -> list[tuple[str, int, int]]:
+    scored = [(_index.get_name(fid), fid, fuzz.token_sort_ratio(chief_name, _index.get_name(fid))) for fid in fids]
+    return sorted(scored, key=lambda match: match[2], reverse=True)
+
+async def resolve_player_name(bot, chief_name) -> tuple[str, tuple | list]:
+    """Resolves a typed chief name in cheap-to-expensive stages, stopping at the first confident answer.
+
+    Stages: 'exact' (case-insensitive), 'normalized' (normalize_name key),
+    'prefix' (unique normalized prefix, at least NAME_PREFIX_MIN_LEN chars),
+    'ngram' (token_sort_ratio over trigram candidates) and 'full'
+    (token_sort_ratio over the whole roster, only when the n-gram stage had
+    nothing and did not already cover every name). 'none' means no stage matched.
+
+    Returns (stage, result). result is a (name, fid, score) tuple when a single
+    player was resolved without needing confirmation (exact/normalized), and
+    otherwise a possibly empty list of (name, fid, score) candidates.
+    Waits for the startup load if it is still running.
+    """
+    chief_name = str(chief_name).strip()
+    await wait_until_loaded()
+    if not chief_name or not len(_index):
+        return 'none', []
+
+    fid = _index.get_fid(chief_name)
+    if fid is not None:
+        return 'exact', (_index.get_name(fid), fid, 100)
+
+    fids = _index.fids_by_normalized(chief_name)
+    if len(fids) == 1:
+        name = _index.get_name(fids[0])
+        return 'normalized', (name, fids[0], 100) # Identical normalized keys
+    if fids: # Several players share the key; let the user pick
+        return 'normalized', _scored(chief_name, fids)[:config.FUZZY_MATCH_LIMIT]
+
+    if len(normalize_name(chief_name)) >= config.NAME_PREFIX_MIN_LEN:
+        fids = _index.fids_by_prefix(chief_name, config.FUZZY_MATCH_LIMIT)
+        if 0 < len(fids) <= config.FUZZY_MATCH_LIMIT:
+            return 'prefix', _scored(chief_name, fids)
 
-    # Use thefuzz to find close matches in Chief Name
-    matches = process.extract(chief_name, lookup_data['Chief Name'].tolist(), limit=limit)
+    matches = await find_fuzzy_matches(chief_name)
+    if matches:
+        return 'ngram', matches
 
-    results = []
-    for match, score in matches:
-        # Find the FID for the matched Chief Name
-        fid = lookup_data[lookup_data['Chief Name'] == match]['FID'].iloc[0]
-        results.append(((match, fid), score))
+    if len(_index) > config.FUZZY_CANDIDATE_LIMIT:
+        matches = _full_scan_matches(chief_name)
+        if matches:
+            return 'full', matches
 
-    bot_log.info(f"Found {len(results)} potential lookup matches for '{chief_name}'")
-    return results
+    return 'none', []
 
 def get_formatted_lookup_data():
-    global lookup_data
-    if lookup_data.empty:
+    if not len(_index):
         return "No lookup data available."
 
-    return lookup_data.to_string(index=False)
+    width = max(len(_name_column), *(len(name) for name in _index.names()))
+    lines = [f"{_name_column:<{width}}  {FID_COLUMN}"]
+    lines += [f"{name:<{width}}  {fid}" for name, fid in _index.entries()]
+    return "\n".join(lines)
 
-# Load data on import
-load_lookup_data()
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Move the lookup roster between the CSV and the fid_lookup table.")
+    parser.add_argument('action', choices=['import', 'export'], help="import: CSV -> table, export: table -> CSV")
+    parser.add_argument('path', nargs='?', default=LOOKUP_FILE)
+    args = parser.parse_args()
+    database.initialize_databases()
+    count = import_lookup_csv(args.path) if args.action == 'import' else export_lookup_csv(args.path)
+    print(f"{args.action.capitalize()}ed {count} lookup entries." if count is not None else f"{args.action.capitalize()} failed; see log.")
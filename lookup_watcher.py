@@ -0,0 +1,116 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import discord
+import config
+import lookup
+
+bot_log = logging.getLogger('registration_bot')
+
+# Watches config.FID_LOOKUP_CSV for edits made outside the bot and feeds them
+# to lookup.sync_lookup_file, which applies only the changed rows. Uses inotify
+# on Linux and falls back to polling the file's mtime/size elsewhere.
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+_EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len
+
+def _open_inotify(directory: str) -> int | None:
+    """Returns a non-blocking inotify fd watching `directory`, or None if inotify is unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    except (OSError, AttributeError) as e:
+        bot_log.info(f"inotify unavailable ({e}); polling {config.FID_LOOKUP_CSV} instead.")
+        return None
+    if fd < 0:
+        return None
+    # Watch the directory, not the file: editors and our own compaction replace the file via rename
+    mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        bot_log.warning(f"inotify_add_watch failed for {directory} (errno {ctypes.get_errno()}); polling instead.")
+        os.close(fd)
+        return None
+    return fd
+
+def _read_inotify_names(fd: int) -> list[str]:
+    names = []
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    offset = 0
+    while offset + _EVENT_HEADER.size <= len(data):
+        _, _, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+        offset += _EVENT_HEADER.size
+        names.append(os.fsdecode(data[offset:offset + name_len].rstrip(b'\0')))
+        offset += name_len
+    return names
+
+async def _wait_inotify(fd: int, changed: asyncio.Event, file_name: str):
+    loop = asyncio.get_running_loop()
+
+    def on_readable():
+        if file_name in _read_inotify_names(fd):
+            changed.set()
+
+    loop.add_reader(fd, on_readable)
+    try:
+        await asyncio.Future() # Runs until cancelled
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+async def _poll_mtime(path: str, changed: asyncio.Event):
+    signature = lookup.file_signature(path)
+    while True:
+        await asyncio.sleep(config.LOOKUP_WATCH_POLL_INTERVAL)
+        current = lookup.file_signature(path)
+        if current != signature:
+            signature = current
+            changed.set()
+
+async def watch_lookup_file(bot: discord.Client):
+    """Keeps the in-memory roster in sync with edits to the lookup CSV until cancelled."""
+    if config.LOOKUP_BACKEND == 'sqlite':
+        bot_log.info("Lookup roster is stored in the database; not watching the CSV.")
+        return
+    path = os.path.abspath(config.FID_LOOKUP_CSV)
+    changed = asyncio.Event()
+    fd = _open_inotify(os.path.dirname(path))
+    if fd is not None:
+        source = asyncio.create_task(_wait_inotify(fd, changed, os.path.basename(path)))
+        bot_log.info(f"Watching {config.FID_LOOKUP_CSV} for changes (inotify).")
+    else:
+        source = asyncio.create_task(_poll_mtime(path, changed))
+        bot_log.info(f"Watching {config.FID_LOOKUP_CSV} for changes (polling every {config.LOOKUP_WATCH_POLL_INTERVAL}s).")
+
+    try:
+        while not bot.is_closed():
+            await changed.wait()
+            # Debounce: wait until the file has been quiet for a full window
+            while True:
+                changed.clear()
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=config.LOOKUP_WATCH_DEBOUNCE)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await lookup.sync_lookup_file(bot)
+            except FileNotFoundError:
+                bot_log.warning(f"{config.FID_LOOKUP_CSV} disappeared; keeping the loaded lookup data.")
+            except Exception as e:
+                bot_log.error(f"Error applying changes from {config.FID_LOOKUP_CSV}: {e}", exc_info=True)
+    finally:
+        source.cancel()
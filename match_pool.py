@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import config
+import lookup
+
+bot_log = logging.getLogger('registration_bot')
+
+# Bulk fuzzy matching (many typed names against the whole roster) runs here,
+# off the event loop and across CPU cores. Each worker scores a chunk of
+# queries against every roster name in one rapidfuzz cdist call. Scores are
+# identical to thefuzz's token_sort_ratio used elsewhere in the bot.
+# numpy/rapidfuzz are imported on first use to keep them off the startup path.
+
+_executor: ProcessPoolExecutor | None = None
+_prepared_version = None
+_prepared_choices: list[str] = []
+_prepared_entries: list[tuple[str, int]] = []
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the bot process has DB and discord threads that must not be forked mid-lock
+        _executor = ProcessPoolExecutor(max_workers=config.MATCH_POOL_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+def _prepare_choices() -> tuple[list[str], list[tuple[str, int]]]:
+    """Roster entries and their thefuzz-processed names, recomputed only when the roster changes."""
+    global _prepared_version, _prepared_choices, _prepared_entries
+    from thefuzz import utils as fuzz_utils
+    version = lookup.get_roster_version()
+    if version != _prepared_version:
+        _prepared_entries = lookup.get_all_lookup_entries(None)
+        _prepared_choices = [fuzz_utils.full_process(name, force_ascii=True) for name, _ in _prepared_entries]
+        _prepared_version = version
+    return _prepared_choices, _prepared_entries
+
+def _match_chunk(queries: list[str], choices: list[str], limit: int, threshold: int) -> list[list[tuple[int, int]]]:
+    """Worker: best `limit` (choice index, score) pairs per query, scores >= threshold, best first."""
+    import numpy as np
+    from rapidfuzz import fuzz, process
+    from thefuzz import utils as fuzz_utils
+    processed = [fuzz_utils.full_process(query, force_ascii=True) for query in queries]
+    # float64 + np.round (half to even) reproduces thefuzz's int(round(score)) exactly
+    scores = np.round(process.cdist(processed, choices, scorer=fuzz.token_sort_ratio, dtype=np.float64, workers=1)).astype(np.int16)
+    results = []
+    for row in scores:
+        best = np.argsort(-row, kind='stable')[:limit]
+        results.append([(int(i), int(row[i])) for i in best if row[i] >= threshold])
+    return results
+
+async def match_names(queries: list[str], limit: int = config.FUZZY_MATCH_LIMIT,
+                      threshold: int = config.FUZZY_MATCH_THRESHOLD) -> list[list[tuple[str, int, int]]]:
+    """Matches every query against the full roster in the process pool.
+
+    Returns one list of (name, fid, score) per query, in query order, each
+    best first and limited like lookup.find_fuzzy_matches.
+    """
+    if not queries:
+        return []
+    choices, entries = _prepare_choices()
+    if not choices:
+        return [[] for _ in queries]
+
+    chunk_size = config.MATCH_POOL_CHUNK_SIZE
+    chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+    loop = asyncio.get_running_loop()
+    try:
+        executor = _get_executor()
+        chunk_results = await asyncio.gather(*(loop.run_in_executor(executor, _match_chunk, chunk, choices, limit, threshold)
+                                               for chunk in chunks))
+    except (BrokenProcessPool, OSError) as e:
+        bot_log.error(f"Match process pool failed ({e}); matching {len(queries)} name(s) in a thread instead.", exc_info=True)
+        shutdown()
+        chunk_results = [await asyncio.to_thread(_match_chunk, chunk, choices, limit, threshold) for chunk in chunks]
+
+    return [[(entries[i][0], entries[i][1], score) for i, score in matches]
+            for chunk in chunk_results for matches in chunk]
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        bot_log.info("Match process pool shut down.")
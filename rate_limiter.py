@@ -0,0 +1,157 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from email.utils import parsedate_to_datetime
+
+bot_log = logging.getLogger('registration_bot')
+
+PRIORITY_INTERACTIVE = 0 # A user is waiting on the result (registration modal, admin register)
+PRIORITY_BACKGROUND = 1 # Retry queues, bulk re-verification
+PRIORITY_PREFETCH = 2 # Speculative fetches nobody may ever use
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucketLimiter:
+    """Async token bucket for an upstream API, with priorities and adaptive slowdown.
+
+    Tokens refill at `rate` per second up to `burst`. Waiters are served
+    strictly by priority, then arrival order. A 429 halves the rate (down to
+    `min_rate`) and pauses all sends for the Retry-After time or an
+    exponential backoff. Each success restores a tenth of the base rate (AIMD).
+    """
+    def __init__(self, rate: float, burst: int, min_rate: float, backoff: float, max_backoff: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.consecutive_limited = 0
+        self.waiters = [] # heap of [priority, seq, future]
+        self.sequence = itertools.count()
+        self.wakeup: asyncio.Event | None = None
+        self.dispatcher: asyncio.Task | None = None
+        self.stats = {'granted': 0, 'waited': 0, 'gave_up': 0, 'rate_limited': 0}
+
+    def _refill(self, now: float):
+        # No tokens accrue during a 429 pause, so it doesn't end in a burst
+        start = max(self.updated_at, self.paused_until)
+        if now > start:
+            self.tokens = min(self.burst, self.tokens + (now - start) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE, max_wait: float | None = None) -> bool:
+        """Waits for a token. Returns False if none was granted within `max_wait` seconds."""
+        now = time.monotonic()
+        self._refill(now)
+        if not self.waiters and now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            self.stats['granted'] += 1
+            return True
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self.sequence), future]
+        heapq.heappush(self.waiters, entry)
+        self.stats['waited'] += 1
+        self._wake()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max_wait)
+            return True
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return True # Granted just as the wait expired
+            future.cancel() # The dispatcher skips cancelled waiters
+            self.stats['gave_up'] += 1
+            return False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def _wake(self):
+        if self.wakeup is None:
+            self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            while self.waiters and self.waiters[0][2].done():
+                heapq.heappop(self.waiters) # Timed out or cancelled
+            if not self.waiters:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                delay = self.paused_until - now
+            elif self.tokens >= 1:
+                _, _, future = heapq.heappop(self.waiters)
+                self.tokens -= 1
+                self.stats['granted'] += 1
+                future.set_result(True)
+                continue
+            else:
+                delay = (1 - self.tokens) / self.rate
+
+            # Sleep until a token is due, but wake early if a 429 changes the schedule
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def spare_tokens(self) -> int:
+        """Tokens that can be taken right now without waiting or delaying anyone queued."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until or any(not future.done() for _, _, future in self.waiters):
+            return 0
+        return int(self.tokens)
+
+    def on_rate_limited(self, retry_after: float | None = None):
+        """Call when the upstream answered 429."""
+        now = time.monotonic()
+        self.stats['rate_limited'] += 1
+        if now >= self.paused_until:
+            # Requests already in flight when the first 429 arrived don't slow us down again
+            self.consecutive_limited += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+        pause = retry_after if retry_after is not None else min(self.max_backoff, self.backoff * 2 ** (self.consecutive_limited - 1))
+        self.paused_until = max(self.paused_until, now + pause)
+        self.tokens = min(self.tokens, 0.0)
+        bot_log.warning(f"Upstream rate limit hit; pausing {pause:.1f}s, send rate now {self.rate:.2f}/s.")
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def on_success(self):
+        """Call when the upstream answered without rate limiting."""
+        self.consecutive_limited = 0
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 10)
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        self._refill(now)
+        return {**self.stats, 'rate': self.rate, 'base_rate': self.base_rate, 'tokens': self.tokens,
+                'queued': sum(1 for _, _, future in self.waiters if not future.done()),
+                'paused_for': max(0.0, self.paused_until - now)}
@@ -1,5 +1,10 @@
 import discord
+import api
+import api_cache
+import rate_limiter
+import circuit_breaker
 import database
+import db_async
 import state
 import lookup
 import logging
@@ -10,9 +15,9 @@ import aiohttp
 import sqlite3
 import hashlib
 import time
-from thefuzz import fuzz, process
 import datetime
 import ui_components
+import verification_queue
 
 bot_log = logging.getLogger('registration_bot')
 
@@ -25,7 +30,17 @@ def get_display_level(numerical_level: int | None) -> str:
     else:
         return f"Level {numerical_level}"
 
-async def call_player_api(session: aiohttp.ClientSession, fid: int) -> dict | None:
+async def call_player_api(session: aiohttp.ClientSession | None, fid: int, use_cache: bool = True,
+                          priority: int = rate_limiter.PRIORITY_INTERACTIVE) -> dict | None:
+    """Player data for `fid` (nickname, stove_lv, kid, avatar_image, ...) or an {"error": ...} dict.
+
+    Served from api_cache when possible; use_cache=False forces a fresh call
+    (whose result still refreshes the cache). Upstream calls go through
+    api_limiter; background jobs should pass PRIORITY_BACKGROUND so users
+    waiting on a registration are served first. PRIORITY_PREFETCH calls are
+    served last and never count toward the circuit breaker. `session`
+    defaults to the shared client from api.py.
+    """
     if not config.API_SECRET:
          bot_log.error("API_SECRET is not configured. Cannot call player API.")
          return {"error": "config_error", "msg": "API Secret not set."}
@@ -33,6 +48,139 @@ async def call_player_api(session: aiohttp.ClientSession, fid: int) -> dict | No
          bot_log.warning(f"Invalid FID provided to API call: {fid}")
          return {"error": "invalid_input", "msg": "Invalid FID."}
 
+    if use_cache:
+        cached = await api_cache.get(fid)
+        if cached is not None:
+            bot_log.debug(f"API cache hit for FID {fid}")
+            return cached
+
+    # Single flight: concurrent calls for one FID share one upstream request. Keyed by priority too,
+    # so nobody inherits another class's wait budget or breaker accounting (e.g. a registration
+    # joining a background re-verification would otherwise wait up to API_BACKGROUND_MAX_WAIT)
+    key = (fid, priority)
+    fetch = _inflight_fetches.get(key)
+    if fetch is None:
+        fetch = asyncio.create_task(_fetch_and_cache(session or await api.create_client_session(), fid, priority))
+        _inflight_fetches[key] = fetch
+        fetch.add_done_callback(lambda _: _inflight_fetches.pop(key, None))
+    else:
+        _single_flight_stats['coalesced'] += 1
+        bot_log.debug(f"Joining in-flight API call for FID {fid}")
+    # shield: a caller giving up (e.g. a cancelled interaction) must not cancel the call for the others
+    result = await asyncio.shield(fetch)
+    return dict(result) if result else result
+
+_inflight_fetches: dict[tuple[int, int], asyncio.Task] = {} # (fid, priority) -> fetch
+_single_flight_stats = {'fetches': 0, 'coalesced': 0}
+api_limiter = rate_limiter.TokenBucketLimiter(
+    rate=config.API_RATE_PER_SECOND, burst=config.API_RATE_BURST, min_rate=config.API_RATE_MIN_PER_SECOND,
+    backoff=config.API_RATE_LIMIT_BACKOFF, max_backoff=config.API_RATE_LIMIT_MAX_BACKOFF)
+api_breaker = circuit_breaker.CircuitBreaker(
+    'player_api', failure_ratio=config.API_BREAKER_FAILURE_RATIO, min_calls=config.API_BREAKER_MIN_CALLS,
+    window=config.API_BREAKER_WINDOW, open_seconds=config.API_BREAKER_OPEN_SECONDS, probes=config.API_BREAKER_HALF_OPEN_PROBES)
+
+def is_upstream_failure(result: dict | None) -> bool:
+    """True for results that say the player API itself is unhealthy (timeouts, connection errors, 5xx, bad bodies)."""
+    if not result:
+        return True
+    error = result.get("error")
+    if not error or error in ("api_logic_fail", "config_error", "invalid_input", "rate_limit", "circuit_open"):
+        return False
+    status = result.get("status")
+    return not (error == "http_error" and isinstance(status, int) and status < 500)
+
+def is_pending_verification(result: dict | None) -> bool:
+    """True when the API couldn't answer right now, so the registration should be re-verified later."""
+    return is_upstream_failure(result) or result.get("error") in ("rate_limit", "circuit_open")
+
+def is_permanent_failure(result: dict | None) -> bool:
+    """True only when the API itself said no about this player (e.g. unknown FID), so retrying can't help."""
+    if not result:
+        return False
+    error, status = result.get("error"), result.get("status")
+    return error == "api_logic_fail" or (error == "http_error" and isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+async def _fetch_and_cache(session: aiohttp.ClientSession, fid: int, priority: int) -> dict | None:
+    _single_flight_stats['fetches'] += 1
+    # A prefetch is only useful while the user is picking, so it gets no longer than a registration would wait
+    max_wait = config.API_BACKGROUND_MAX_WAIT if priority == rate_limiter.PRIORITY_BACKGROUND else config.API_INTERACTIVE_MAX_WAIT
+    deadline = time.monotonic() + max_wait
+    # Checked before queueing for a token: while the API is down, callers fail fast instead of waiting on it
+    permit = api_breaker.allow()
+    if permit is None:
+        return {"error": "circuit_open", "msg": "Player API unavailable"}
+    while True:
+        if not await api_limiter.acquire(priority, max(0.0, deadline - time.monotonic())):
+            bot_log.warning(f"Gave up waiting {max_wait:.0f}s for an API rate-limit slot for FID {fid}.")
+            api_breaker.release(permit)
+            return {"error": "rate_limit", "status": 429, "msg": "Rate limited (gave up waiting)"}
+        try:
+            result = await _fetch_player(session, fid)
+        except asyncio.CancelledError:
+            api_breaker.release(permit)
+            raise
+        if not (result and result.get("error") == "rate_limit"):
+            api_limiter.on_success()
+            break
+        # 429: slow down, then retry within this caller's wait budget
+        api_limiter.on_rate_limited(result.get("retry_after"))
+
+    if priority == rate_limiter.PRIORITY_PREFETCH:
+        api_breaker.release(permit) # Speculative traffic must not trip (or hold open) the breaker for real callers
+    elif is_upstream_failure(result):
+        api_breaker.record_failure(permit)
+    else:
+        api_breaker.record_success(permit)
+    await api_cache.put(fid, result)
+    return result
+
+def get_single_flight_stats() -> dict:
+    return {**_single_flight_stats, 'in_flight': len(_inflight_fetches)}
+
+_prefetch_stats = {'started': 0, 'used': 0}
+
+def prefetch_players(session: aiohttp.ClientSession | None, fids: list[int]) -> dict[int, asyncio.Task]:
+    """Starts call_player_api for likely picks while the user is still choosing between them.
+
+    Only uses rate-limit tokens that are spare right now (keeping
+    API_PREFETCH_RESERVE back) and runs at PRIORITY_PREFETCH, so speculation
+    never queues ahead of or delays real calls. Nothing is prefetched unless
+    the circuit breaker is closed, so prefetches never take its recovery probes.
+    Returns the started tasks by FID; pass them to prefetched_result().
+    """
+    if api_breaker.state != circuit_breaker.CLOSED:
+        return {}
+    budget = min(config.API_PREFETCH_CANDIDATES, api_limiter.spare_tokens() - config.API_PREFETCH_RESERVE)
+    tasks = {fid: asyncio.create_task(call_player_api(session, fid, priority=rate_limiter.PRIORITY_PREFETCH))
+             for fid in fids[:max(0, budget)]}
+    _prefetch_stats['started'] += len(tasks)
+    if tasks:
+        bot_log.debug(f"Prefetching player data for FID(s) {list(tasks)}")
+    return tasks
+
+async def prefetched_result(tasks: dict[int, asyncio.Task], fid: int) -> dict | None:
+    """Player data for `fid` from a prefetch (waiting for it if still running), or None if there is none usable."""
+    task = tasks.get(fid)
+    if task is None or task.cancelled():
+        return None
+    try:
+        result = await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise # Our caller is being cancelled, not the prefetch
+        return None
+    except Exception as e:
+        bot_log.warning(f"Prefetch for FID {fid} failed: {e}")
+        return None
+    if not result or result.get("error"):
+        return None
+    _prefetch_stats['used'] += 1
+    return result
+
+def get_prefetch_stats() -> dict:
+    return dict(_prefetch_stats)
+
+async def _fetch_player(session: aiohttp.ClientSession, fid: int) -> dict | None:
     try:
         current_time_ms = int(time.time() * 1000)
         form_part = f"fid={fid}&time={current_time_ms}"
@@ -41,7 +189,8 @@ async def call_player_api(session: aiohttp.ClientSession, fid: int) -> dict | No
         form_payload = f"sign={sign}&{form_part}"
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
-        async with session.post(config.API_PLAYER_URL, headers=headers, data=form_payload, timeout=15) as response:
+        # Timeouts come from the session (config.HTTP_TIMEOUT_*)
+        async with session.post(config.API_PLAYER_URL, headers=headers, data=form_payload) as response:
             response_text = await response.text()
             bot_log.debug(f"API Call: FID={fid}, Status={response.status}, Response='{response_text[:200]}...'")
 
@@ -68,8 +217,9 @@ async def call_player_api(session: aiohttp.ClientSession, fid: int) -> dict | No
                     bot_log.warning(f"API Call for FID {fid} failed logically: Code={api_code}, Msg='{api_msg}'")
                     return {"error": "api_logic_fail", "msg": api_msg, "code": api_code}
             elif response.status == 429:
-                bot_log.warning(f"API Call for FID {fid} hit rate limit (429).")
-                return {"error": "rate_limit", "status": 429}
+                retry_after = rate_limiter.parse_retry_after(response.headers.get('Retry-After'))
+                bot_log.warning(f"API Call for FID {fid} hit rate limit (429). Retry-After: {retry_after}")
+                return {"error": "rate_limit", "status": 429, "retry_after": retry_after}
             else:
                 bot_log.warning(f"API Call for FID {fid} failed with HTTP Status {response.status}. Response: {response_text[:500]}")
                 return {"error": "http_error", "status": response.status, "msg": f"HTTP {response.status}"}
@@ -117,6 +267,7 @@ async def _process_registration(
     avatar_image = None
     kingdom_id = None
     verified_fc_level = None
+    verification_pending = 0
     verified_fc_display = None
 
     if player_fid and not api_data:
@@ -125,8 +276,14 @@ async def _process_registration(
         if api_result and not api_result.get("error"):
             api_data = api_result
             bot_log.info(f"   API call successful for FID {player_fid}.")
-        else:
+        elif is_pending_verification(api_result):
+            # API down or overloaded: save now with the entered FC level and verify later
+            verification_pending = 1
             error_detail = api_result.get("msg", api_result.get("error", "Unknown Error")) if api_result else "No response"
+            api_status_msg = f"{config.EMOJI_WARNING} Game API unavailable right now; registration saved with the entered FC level and will be verified automatically."
+            bot_log.warning(f"   API unavailable for FID {player_fid} ({error_detail}); saving as pending verification.")
+        else:
+            error_detail = api_result.get("msg", api_result.get("error", "Unknown Error"))
             api_status_msg = f"{config.EMOJI_ERROR} Could not verify via API ({error_detail}). Using entered FC level if available."
             bot_log.warning(f"   API Call failed for FID {player_fid}: {error_detail}")
 
@@ -170,7 +327,7 @@ async def _process_registration(
 
     if is_self_reg and player_fid is not None:
         # Check if this FID is already registered for this event (Self-reg specific check)
-        existing_reg = database.get_registration_by_fid_event(player_fid, event) # ADD THIS FUNCTION TO database.py
+        existing_reg = await db_async.get_registration_by_fid_event(player_fid, event) # ADD THIS FUNCTION TO database.py
         if existing_reg:
              existing_name = existing_reg.get('chief_name', 'Unknown')
              bot_log.warning(f"   Self-registration attempt blocked for FID {player_fid} ({existing_name}), Event {event} - already registered.")
@@ -180,8 +337,8 @@ async def _process_registration(
     db_fc_level_to_save = verified_fc_level if verified_fc_level is not None else (entered_fc_level + 30 if entered_fc_level is not None else None)
     db_fc_display_to_save = verified_fc_display
 
-    bot_log.info(f"   Calling database.register_player for '{chief_name_to_save}' (Event: {event})...")
-    success = database.register_player(
+    bot_log.info(f"   Queueing registration write for '{chief_name_to_save}' (Event: {event})...")
+    write_result = await db_async.queue_registration(
         user_id=submitter_user_id,
         user_name=submitter_user_name,
         chief_name=chief_name_to_save,
@@ -193,24 +350,26 @@ async def _process_registration(
         player_fid=player_fid,
         kingdom_id=kingdom_id,
         verified_fc_level=db_fc_level_to_save,
-        verified_fc_display=db_fc_display_to_save
+        verified_fc_display=db_fc_display_to_save,
+        verification_pending=verification_pending,
+        link_discord_id=submitter_user_id if is_self_reg and player_fid is not None else None
     )
 
-    if not success:
+    if not write_result['success']:
          error_msg = f"{config.EMOJI_ERROR} Database error saving registration. Please try again or contact an admin."
          if interaction.response.is_done(): await interaction.followup.send(error_msg, ephemeral=True)
          else: await interaction.response.send_message(error_msg, ephemeral=True)
          return
 
-    bot_log.info(f"   Database registration successful for '{chief_name_to_save}'.")
+    bot_log.info(f"   Database registration successful for '{chief_name_to_save}' (Updated existing: {write_result['updated_existing']}).")
+    if verification_pending:
+        verification_queue.notify()
 
     if is_self_reg and player_fid is not None:
-        bot_log.info(f"   Calling database.link_discord_fid for {submitter_user_id} -> {player_fid}...")
-        link_added = database.link_discord_fid(submitter_user_id, player_fid)
-        if link_added:
+        if write_result['link_added']:
             bot_log.info(f"   Stored new Discord link: {submitter_user_id} -> FID {player_fid}")
         else:
-             existing_link_discord_id = database.get_linked_discord_user(player_fid)
+             existing_link_discord_id = await db_async.get_linked_discord_user(player_fid)
              if existing_link_discord_id and existing_link_discord_id != submitter_user_id:
                  bot_log.warning(f"   FID {player_fid} is already linked to Discord ID {existing_link_discord_id}. Cannot link to {submitter_user_id}.")
                  api_status_msg += f"\n{config.EMOJI_WARNING} Note: This game FID (`{player_fid}`) is already linked to another Discord user."
@@ -218,8 +377,11 @@ async def _process_registration(
                  bot_log.info(f"   Confirmed existing Discord link: {submitter_user_id} -> FID {player_fid}")
 
 
-    await state.recalculate_all_counters(bot)
-    asyncio.create_task(state.update_registration_embed(bot))
+    if write_result['updated_existing']:
+        state.move_counter(bot, event, write_result['previous_time_slot'], write_result['previous_substitute'], time_slot, sub_db_value)
+    else:
+        state.increment_counter(bot, event, time_slot, sub_db_value)
+    state.schedule_embed_update(bot)
 
     sub_text = f" ({config.EMOJI_SUB} Sub)" if is_substitute else ""
     title = f"{config.EMOJI_SUCCESS} Registration Confirmed"
@@ -250,7 +412,7 @@ async def cancel_registration_logic(interaction: discord.Interaction, button: di
     bot_log.info(f"   Executing cancellation logic: Chief='{chief_name}', Event='{event}'")
 
     # Fetch registration info before attempting delete to get details for state update
-    reg_info = database.get_registration_by_chief_name_event_slot(chief_name, event, "AnySlotPlaceholder") # Need to fix database function or logic if slot isn't needed for unique key
+    reg_info = await db_async.get_registration_by_chief_name_event(chief_name, event) # (chief_name, event) is the unique key
     if not reg_info:
          bot_log.warning(f"   Registration not found for Chief='{chief_name}', Event='{event}'. Already cancelled?")
          if button and button.view:
@@ -265,12 +427,12 @@ async def cancel_registration_logic(interaction: discord.Interaction, button: di
 
     bot_log.info(f"   Found registration. Sub: {was_substitute}, Slot: {time_slot}")
     bot_log.info(f"   Calling database.unregister_player...")
-    success = database.unregister_player(chief_name, event)
+    success = await db_async.unregister_player(chief_name, event)
 
     if success:
         bot_log.info(f"   Database unregistration successful for '{chief_name}' for event '{event}'.")
-        await state.recalculate_all_counters(interaction.client)
-        asyncio.create_task(state.update_registration_embed(interaction.client))
+        state.decrement_counter(interaction.client, event, time_slot, was_substitute)
+        state.schedule_embed_update(interaction.client)
 
         if button and button.view:
             button.disabled = True
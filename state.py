@@ -1,6 +1,6 @@
 import discord
 import config
-import database
+import db_async
 import logging
 import os
 import asyncio
@@ -34,40 +34,101 @@ def load_registration_message_ids() -> tuple[int | None, int | None]:
         bot_log.error(f"Failed to load persistent message IDs from {PERSISTENCE_FILE_PATH}: {e}")
         return None, None
 
+def _build_counters(slot_counts: list[dict]) -> tuple[dict, dict]:
+    time_slot_counts = {}
+    substitute_counts = {}
+    for row in slot_counts:
+        event = row['event']
+        slot = row['time_slot']
+        is_sub = bool(row['substitute'])
+
+        time_slot_counts.setdefault(event, {}).setdefault(slot, 0)
+        substitute_counts.setdefault(event, {}).setdefault(slot, 0)
+
+        if not is_sub:
+             time_slot_counts[event][slot] += row['count']
+        else:
+             substitute_counts[event][slot] += row['count']
+    return time_slot_counts, substitute_counts
+
 async def recalculate_all_counters(bot: discord.Client):
     bot_log.info("Recalculating all registration counters...")
-    bot.time_slot_counts = {}
-    bot.substitute_counts = {}
-    time_slots = ["14UTC", "19UTC"]
-
     try:
-        all_regs = database.get_all_registrations()
-        for reg in all_regs:
-            event = reg['event']
-            slot = reg['time_slot']
-            is_sub = bool(reg['substitute'])
-
-            if event not in bot.time_slot_counts:
-                bot.time_slot_counts[event] = {}
-            if event not in bot.substitute_counts:
-                bot.substitute_counts[event] = {}
-
-            if slot not in bot.time_slot_counts[event]:
-                 bot.time_slot_counts[event][slot] = 0
-            if slot not in bot.substitute_counts[event]:
-                 bot.substitute_counts[event][slot] = 0
-
-            if not is_sub:
-                 bot.time_slot_counts[event][slot] += 1
-            else:
-                 bot.substitute_counts[event][slot] += 1
-
+        slot_counts = await db_async.get_registration_counts()
+        bot.time_slot_counts, bot.substitute_counts = _build_counters(slot_counts)
         bot_log.info(f"Finished recalculating counters. Main: {bot.time_slot_counts}, Sub: {bot.substitute_counts}")
 
     except Exception as e:
         bot_log.error(f"Error recalculating counters: {e}", exc_info=True)
 
 
+# --- Delta Counter Updates ---
+# Registration flows report the exact change they made instead of triggering a
+# full recount; verify_counters periodically reconciles against the DB.
+
+def _adjust_counter(bot: discord.Client, event: str, slot: str, is_sub: bool, delta: int):
+    counts = bot.substitute_counts if is_sub else bot.time_slot_counts
+    event_counts = counts.setdefault(event, {})
+    event_counts[slot] = max(0, event_counts.get(slot, 0) + delta)
+
+def increment_counter(bot: discord.Client, event: str, slot: str, is_sub: bool):
+    _adjust_counter(bot, event, slot, bool(is_sub), 1)
+
+def decrement_counter(bot: discord.Client, event: str, slot: str, is_sub: bool):
+    _adjust_counter(bot, event, slot, bool(is_sub), -1)
+
+def move_counter(bot: discord.Client, event: str, old_slot: str, old_is_sub: bool, new_slot: str, new_is_sub: bool):
+    """Moves one registration between slots/sub status, e.g. when an upsert replaced an existing registration."""
+    if old_slot == new_slot and bool(old_is_sub) == bool(new_is_sub):
+        return
+    _adjust_counter(bot, event, old_slot, bool(old_is_sub), -1)
+    _adjust_counter(bot, event, new_slot, bool(new_is_sub), 1)
+
+def reset_counters(bot: discord.Client):
+    bot.time_slot_counts = {}
+    bot.substitute_counts = {}
+
+def _counter_drift(memory: dict, db: dict) -> dict:
+    """(event, slot) -> DB count minus in-memory count, for every slot where they differ."""
+    keys = {(event, slot) for counts in (memory, db) for event, slots in counts.items() for slot in slots}
+    drift = {(event, slot): db.get(event, {}).get(slot, 0) - memory.get(event, {}).get(slot, 0) for event, slot in keys}
+    return {key: delta for key, delta in drift.items() if delta}
+
+async def verify_counters(bot: discord.Client) -> bool:
+    """Compares the in-memory counters with the DB. Returns True if they match.
+
+    A single mismatch can be a registration whose write has committed but whose
+    delta has not been applied yet, so counters are only resynced when the same
+    drift is still present on the next check.
+    """
+    slot_counts = await db_async.get_registration_counts()
+    db_main, db_sub = _build_counters(slot_counts)
+    drift = (_counter_drift(bot.time_slot_counts, db_main), _counter_drift(bot.substitute_counts, db_sub))
+    if not any(drift):
+        bot.counter_drift = None
+        return True
+
+    if drift != getattr(bot, 'counter_drift', None):
+        bot_log.info(f"Registration counters differ from DB by {drift}; re-checking before resync.")
+        bot.counter_drift = drift
+        return False
+
+    bot_log.warning(f"Registration counters drifted from DB. Memory: Main {bot.time_slot_counts}, Sub {bot.substitute_counts}. "
+                    f"DB: Main {db_main}, Sub {db_sub}. Resyncing.")
+    bot.time_slot_counts, bot.substitute_counts = db_main, db_sub
+    bot.counter_drift = None
+    schedule_embed_update(bot)
+    return False
+
+async def counter_consistency_loop(bot: discord.Client):
+    while not bot.is_closed():
+        await asyncio.sleep(config.COUNTER_CHECK_INTERVAL)
+        try:
+            await verify_counters(bot)
+        except Exception as e:
+            bot_log.error(f"Error checking registration counters against DB: {e}", exc_info=True)
+
+
 def build_registration_embed(bot: discord.Client) -> discord.Embed:
     embed = discord.Embed(
         title=f"{config.EMOJI_EVENT} Event Registration",
@@ -101,36 +162,83 @@ def build_registration_embed(bot: discord.Client) -> discord.Embed:
     return embed
 
 
+def _get_registration_message(bot: discord.Client) -> discord.PartialMessage | None:
+    channel_id, message_id = bot.persistent_channel_id, bot.persistent_message_id
+    if not channel_id or not message_id:
+        channel_id, message_id = load_registration_message_ids()
+    if not channel_id or not message_id:
+        return None
+
+    # Reuse the cached PartialMessage so an edit never needs a fetch_message round trip
+    cached = bot.registration_message
+    if cached and cached.id == message_id and cached.channel.id == channel_id:
+        return cached
+
+    channel = bot.get_channel(channel_id) or bot.get_partial_messageable(channel_id)
+    bot.registration_message = channel.get_partial_message(message_id)
+    bot.last_rendered_embed = None
+    return bot.registration_message
+
+
+def _render_key(embed: discord.Embed, active_events: list[str]) -> tuple:
+    rendered = embed.to_dict()
+    rendered.pop('timestamp', None) # Always changes; not a reason to edit
+    return repr(rendered), tuple(active_events)
+
+
 async def update_registration_embed(bot: discord.Client):
-    channel_id, message_id = load_registration_message_ids()
+    import ui_components # Imported here; ui_components imports registration which imports state
 
-    if not channel_id or not message_id:
+    message = _get_registration_message(bot)
+    if message is None:
         bot_log.warning("No persistent message IDs found. Cannot update registration embed.")
         return
 
-    await recalculate_all_counters(bot)
-
+    channel_id = message.channel.id
     try:
-        channel = bot.get_channel(channel_id)
-        if not channel:
-            bot_log.error(f"Persistent message channel not found (ID: {channel_id}).")
-            return
-        message = await channel.fetch_message(message_id)
-        if not message:
-            bot_log.error(f"Persistent message not found (ID: {message_id}) in channel {channel_id}.")
+        new_embed = build_registration_embed(bot)
+        render_key = _render_key(new_embed, config.DEFAULT_ACTIVE_EVENTS)
+        if render_key == bot.last_rendered_embed:
+            bot_log.debug("Registration embed unchanged; skipping edit.")
             return
 
-        new_embed = build_registration_embed(bot)
-        view = ui_components.EventSelectionView(config.DEFAULT_ACTIVE_EVENTS) # Need ui_components here
+        view = ui_components.EventSelectionView(config.DEFAULT_ACTIVE_EVENTS)
 
         await message.edit(embed=new_embed, view=view)
+        bot.last_rendered_embed = render_key
         bot_log.info(f"Updated persistent registration embed in channel {channel_id}.")
 
     except discord.NotFound:
-        bot_log.error(f"Persistent message or channel not found (Channel ID: {channel_id}, Message ID: {message_id}). Was it deleted?")
+        bot_log.error(f"Persistent message or channel not found (Channel ID: {channel_id}, Message ID: {message.id}). Was it deleted?")
+        bot.registration_message = None
         # Consider clearing persistence file here
     except discord.Forbidden:
         bot_log.error(f"Missing permissions to fetch or edit persistent message in channel {channel_id}.")
     except Exception as e:
         bot_log.error(f"Unexpected error updating persistent registration embed: {e}", exc_info=True)
 
+
+# --- Coalescing Embed Updater ---
+# Registration flows only mark the embed dirty; one background task turns any
+# number of notifications into at most one edit per EMBED_UPDATE_INTERVAL.
+
+def schedule_embed_update(bot: discord.Client):
+    if bot.embed_dirty is None:
+        bot.embed_dirty = asyncio.Event()
+    bot.embed_dirty.set()
+    if bot.embed_updater_task is None or bot.embed_updater_task.done():
+        bot.embed_updater_task = asyncio.create_task(_embed_updater_loop(bot))
+
+
+async def _embed_updater_loop(bot: discord.Client):
+    loop = asyncio.get_running_loop()
+    last_edit = 0.0
+    while not bot.is_closed():
+        await bot.embed_dirty.wait()
+        delay = last_edit + config.EMBED_UPDATE_INTERVAL - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Clear before rendering so changes made during the edit schedule another pass
+        bot.embed_dirty.clear()
+        await update_registration_embed(bot)
+        last_edit = loop.time()
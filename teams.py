@@ -1,4 +1,5 @@
 import database
+import db_async
 import discord
 import config
 import asyncio
@@ -8,7 +9,7 @@ bot_log = logging.getLogger('registration_bot')
 
 async def _perform_assignment(channel: discord.TextChannel):
     bot_log.info("Starting team assignment process...")
-    registrations = database.get_all_registrations()
+    registrations = await db_async.get_all_registrations()
     if not registrations:
         bot_log.info("No registrations found for team assignment.")
         await channel.send("No players are currently registered for any event slots. Team assignment skipped.")
@@ -0,0 +1,121 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def _breaker(**overrides) -> circuit_breaker.CircuitBreaker:
+    settings = {'failure_ratio': 0.5, 'min_calls': 4, 'window': 30.0, 'open_seconds': 10.0, 'probes': 1}
+    settings.update(overrides)
+    return circuit_breaker.CircuitBreaker('test', **settings)
+
+
+def _open(breaker: circuit_breaker.CircuitBreaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure(breaker.allow())
+    assert breaker.state == OPEN
+
+
+def test_opens_only_once_min_calls_reached_the_failure_ratio(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure(breaker.allow())
+    assert breaker.state == CLOSED # 3 calls < min_calls
+
+    breaker.record_success(breaker.allow())
+    assert breaker.state == CLOSED # 3/4 failed, but only now are there enough calls to judge
+    breaker.record_failure(breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['opened'] == 1
+
+
+def test_outcomes_outside_the_window_are_forgotten(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record_failure(breaker.allow())
+    clock.now += 31
+    breaker.record_failure(breaker.allow())
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()['recent_calls'] == 1
+
+
+def test_open_refuses_until_open_seconds_then_lets_probes_through(clock):
+    breaker = _breaker(probes=2)
+    _open(breaker)
+    assert breaker.allow() is None
+    assert breaker.get_stats()['rejected'] == 1
+
+    clock.now += 10
+    first, second = breaker.allow(), breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert first is not None and second is not None
+    assert breaker.allow() is None # Both probe slots taken
+
+    breaker.release(first)
+    assert breaker.allow() is not None # A neutral outcome frees its slot
+
+
+def test_probe_success_closes_and_probe_failure_reopens(clock):
+    breaker = _breaker()
+    _open(breaker)
+    clock.now += 10
+    breaker.record_failure(breaker.allow())
+    assert breaker.state == OPEN
+    assert breaker.get_stats()['opened'] == 2
+
+    clock.now += 10
+    breaker.record_success(breaker.allow())
+    assert breaker.state == CLOSED
+    assert breaker.get_stats()['recent_calls'] == 0
+
+
+def test_calls_admitted_while_closed_do_not_decide_half_open(clock):
+    breaker = _breaker()
+    straggler_ok, straggler_failed, straggler_neutral = breaker.allow(), breaker.allow(), breaker.allow()
+    _open(breaker)
+    clock.now += 10
+    probe = breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+    breaker.record_success(straggler_ok)
+    breaker.record_failure(straggler_failed)
+    breaker.release(straggler_neutral)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is None # The probe slot is still held by the real probe
+
+    breaker.record_success(probe)
+    assert breaker.state == CLOSED
+
+
+def test_probe_from_an_earlier_round_is_ignored(clock):
+    breaker = _breaker(probes=2)
+    _open(breaker)
+    clock.now += 10
+    slow_probe, failed_probe = breaker.allow(), breaker.allow()
+    breaker.record_failure(failed_probe)
+    assert breaker.state == OPEN
+    clock.now += 10
+    current_probe = breaker.allow()
+
+    breaker.record_success(slow_probe) # Belongs to the previous half-open round
+    assert breaker.state == HALF_OPEN
+    breaker.record_success(current_probe)
+    assert breaker.state == CLOSED
@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'DB_MAIN_FILE', str(tmp_path / 'registrations.db'))
+    database.initialize_databases()
+    yield
+    database.close_all_connections()
+
+
+def _registration(chief_name: str, **overrides) -> dict:
+    reg = {'user_id': 1, 'user_name': 'user', 'chief_name': chief_name, 'entered_fc_level': 5, 'event': 'Foundry',
+           'substitute': 0, 'time_slot': '14UTC', 'is_self_registration': 0, 'player_fid': None, 'kingdom_id': None,
+           'verified_fc_level': None, 'verified_fc_display': None}
+    reg.update(overrides)
+    return reg
+
+
+def _trace_pooled_connection(statements: list[str]):
+    # The pool is LIFO, so the next borrower gets the connection released here
+    conn = database._acquire_connection()
+    conn.set_trace_callback(statements.append)
+    database._release_connection(conn)
+    return conn
+
+
+def test_register_players_batch_commits_once(db):
+    statements = []
+    conn = _trace_pooled_connection(statements)
+    try:
+        results = database.register_players_batch([_registration(f"Chief{i}") for i in range(10)])
+    finally:
+        conn.set_trace_callback(None)
+
+    assert all(result['success'] for result in results)
+    assert sum(1 for statement in statements if statement.strip().upper() == 'COMMIT') == 1
+    assert len(database.get_all_registrations()) == 10
+
+
+def test_register_players_batch_failed_item_keeps_the_rest(db):
+    batch = [_registration("Chief1"), _registration(None), _registration("Chief2")] # chief_name is NOT NULL
+    results = database.register_players_batch(batch)
+
+    assert [result['success'] for result in results] == [True, False, True]
+    assert database.is_registered("Chief1", "Foundry") and database.is_registered("Chief2", "Foundry")
+    assert len(database.get_all_registrations()) == 2
+
+
+def test_dropped_verification_is_not_backfilled_on_restart(db):
+    database.register_players_batch([_registration("Chief1", player_fid=111, verification_pending=1),
+                                     _registration("Chief2", player_fid=222, verification_pending=1)])
+    assert database.drop_verification(111, "role not exist.")
+
+    database.close_all_connections()
+    database.initialize_databases() # Restart: the backfill re-queues unverified registrations
+
+    queued = {item['player_fid'] for item in database.get_due_verifications(float('inf'), 10)}
+    assert queued == {222}
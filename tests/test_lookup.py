@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+import lookup
+
+
+@pytest.fixture
+def roster_files(tmp_path, monkeypatch):
+    csv_path, journal_path = tmp_path / 'alliance_lookup.csv', tmp_path / 'alliance_lookup.journal'
+    monkeypatch.setattr(lookup, 'LOOKUP_FILE', str(csv_path))
+    monkeypatch.setattr(lookup, 'JOURNAL_FILE', str(journal_path))
+    monkeypatch.setattr(config, 'LOOKUP_BACKEND', 'csv')
+    csv_path.write_text("ChiefName,FID\nAlpha,1\nBravo,2\n", encoding='utf-8')
+    return csv_path, journal_path
+
+
+@pytest.mark.parametrize('typed', ["MoeBear", "moe_bear", "-Itz___MoeBear", "ＭｏｅＢｅａｒ", "  Moe Bear "])
+def test_normalize_name_ignores_case_width_and_decorations(typed):
+    assert lookup.normalize_name(typed) == "moebear"
+
+
+def test_normalize_name_keeps_names_made_only_of_separators():
+    assert lookup.normalize_name("___") == "___"
+
+
+def test_replay_journal_applies_adds_and_removes_in_order(tmp_path):
+    journal = tmp_path / 'journal'
+    journal.write_text("+,Charlie,3\n-,,1\n+,Alpha Two,1\n", encoding='utf-8')
+    index = lookup.LookupIndex()
+    index.add("Alpha", 1)
+
+    records, offset = lookup._replay_journal(index, str(journal))
+
+    assert records == 3 and offset == journal.stat().st_size
+    assert index.fid_to_name == {1: "Alpha Two", 3: "Charlie"}
+    assert index.get_fid("alpha two") == 1 and index.get_fid("Alpha") is None
+
+
+def test_replay_journal_skips_malformed_and_torn_records(tmp_path):
+    journal = tmp_path / 'journal'
+    journal.write_bytes(b"+,Charlie,3\n*,Bad,4\n+,NoFid,abc\n+,Torn,5")
+    index = lookup.LookupIndex()
+
+    records, offset = lookup._replay_journal(index, str(journal))
+
+    assert records == 1
+    assert offset == len(b"+,Charlie,3\n*,Bad,4\n+,NoFid,abc\n") # The torn record is re-read once completed
+    assert index.fid_to_name == {3: "Charlie"}
+
+
+def test_replay_journal_resumes_from_offset(tmp_path):
+    journal = tmp_path / 'journal'
+    journal.write_text("+,Charlie,3\n", encoding='utf-8')
+    index = lookup.LookupIndex()
+    _, offset = lookup._replay_journal(index, str(journal))
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write("+,Delta,4\n")
+
+    records, _ = lookup._replay_journal(index, str(journal), offset)
+
+    assert records == 1
+    assert index.fid_to_name == {3: "Charlie", 4: "Delta"}
+
+
+def test_build_index_replays_the_journal_over_the_csv(roster_files):
+    _, journal_path = roster_files
+    journal_path.write_text("+,Charlie,3\n-,Alpha,1\n", encoding='utf-8')
+
+    index, name_column, records, offset, _ = lookup._build_index()
+
+    assert name_column == 'ChiefName'
+    assert records == 2 and offset == journal_path.stat().st_size
+    assert index.fid_to_name == {2: "Bravo", 3: "Charlie"}
+
+
+def test_compaction_folds_the_journal_into_the_csv(roster_files, monkeypatch):
+    csv_path, journal_path = roster_files
+    monkeypatch.setattr(config, 'LOOKUP_JOURNAL_COMPACT_THRESHOLD', 1000)
+
+    async def scenario():
+        await lookup.load_lookup_data_async(None)
+        assert await lookup.add_lookup_entry(None, "Charlie", 3)
+        assert await lookup.remove_lookup_entry(None, 1)
+        assert journal_path.read_text(encoding='utf-8') == "+,Charlie,3\n-,Alpha,1\n"
+        assert await lookup.compact_lookup_journal()
+
+    asyncio.run(scenario())
+    assert journal_path.read_text(encoding='utf-8') == ""
+    rebuilt, _, records, _, _ = lookup._build_index()
+    assert records == 0 and rebuilt.fid_to_name == {2: "Bravo", 3: "Charlie"}
+
+
+def test_compaction_keeps_an_external_edit(roster_files):
+    csv_path, journal_path = roster_files
+
+    async def scenario():
+        await lookup.load_lookup_data_async(None)
+        assert await lookup.add_lookup_entry(None, "Charlie", 3)
+        csv_path.write_text("ChiefName,FID\nAlpha,1\nBravo,2\nEcho,5\n", encoding='utf-8') # Officer edit
+        return await lookup.compact_lookup_journal()
+
+    assert not asyncio.run(scenario())
+    assert "Echo" in csv_path.read_text(encoding='utf-8')
+    assert journal_path.read_text(encoding='utf-8') == "+,Charlie,3\n"
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import rate_limiter
+from rate_limiter import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH
+
+
+def _limiter(rate: float = 20.0, burst: int = 1) -> rate_limiter.TokenBucketLimiter:
+    return rate_limiter.TokenBucketLimiter(rate=rate, burst=burst, min_rate=1.0, backoff=0.1, max_backoff=1.0)
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def scenario():
+        limiter = _limiter()
+        assert await limiter.acquire() # Empties the bucket; everyone below has to queue
+        order = []
+
+        async def take(label: str, priority: int):
+            assert await limiter.acquire(priority, max_wait=2.0)
+            order.append(label)
+
+        tasks = [asyncio.create_task(take('prefetch', PRIORITY_PREFETCH)),
+                 asyncio.create_task(take('background 1', PRIORITY_BACKGROUND)),
+                 asyncio.create_task(take('background 2', PRIORITY_BACKGROUND)),
+                 asyncio.create_task(take('interactive', PRIORITY_INTERACTIVE))]
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ['interactive', 'background 1', 'background 2', 'prefetch']
+
+
+def test_gives_up_after_max_wait():
+    async def scenario():
+        limiter = _limiter(rate=1.0)
+        assert await limiter.acquire()
+        started = time.monotonic()
+        granted = await limiter.acquire(PRIORITY_INTERACTIVE, max_wait=0.05)
+        return granted, time.monotonic() - started, limiter.get_stats()
+
+    granted, waited, stats = asyncio.run(scenario())
+    assert not granted
+    assert 0.04 <= waited < 0.5
+    assert stats['gave_up'] == 1 and stats['queued'] == 0
+
+
+def test_rate_limited_pauses_for_retry_after_and_halves_the_rate():
+    async def scenario():
+        limiter = _limiter(rate=100.0, burst=5)
+        limiter.on_rate_limited(retry_after=0.2)
+        assert limiter.spare_tokens() == 0
+        assert not await limiter.acquire(max_wait=0.05) # Still paused
+        started = time.monotonic()
+        assert await limiter.acquire(max_wait=1.0)
+        return time.monotonic() - started, limiter.get_stats()
+
+    waited, stats = asyncio.run(scenario())
+    assert waited >= 0.1 # The rest of the 0.2s pause
+    assert stats['rate'] == 50.0 and stats['rate_limited'] == 1
+
+
+def test_success_restores_the_rate_gradually():
+    limiter = _limiter(rate=100.0)
+    limiter.on_rate_limited(retry_after=1.0)
+    limiter.on_rate_limited(retry_after=1.0) # In flight when the first 429 arrived: not halved again
+    assert limiter.rate == 50.0
+    limiter.on_success()
+    assert limiter.rate == 60.0
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 100.0
+
+
+def test_parse_retry_after():
+    assert rate_limiter.parse_retry_after("3") == 3.0
+    assert rate_limiter.parse_retry_after("-1") == 0.0
+    assert rate_limiter.parse_retry_after("soon") is None
+    assert rate_limiter.parse_retry_after(None) is None
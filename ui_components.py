@@ -7,6 +7,8 @@ import lookup
 import registration
 import teams # Assuming teams module handles captain toggle logic
 import database
+import db_async
+import state
 # import utils # Assuming utils module contains get_display_level
 # import logger # Removed as it caused AttributeError
 import logging # Import standard logging
@@ -42,7 +44,7 @@ except ImportError:
 
 
 class PossibleNameSelect(Select):
-    def __init__(self, possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level):
+    def __init__(self, possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level, prefetches=None):
         # original_interaction is problematic to pass directly due to pickling for persistence.
         # We need to rethink how the modal submit or the fuzzy select gets access to the original modal inputs.
         # The current ChiefNameModal approach retrieves values directly from its own inputs in on_submit,
@@ -56,6 +58,7 @@ class PossibleNameSelect(Select):
         self.is_substitute = is_substitute
         self.registration_target = registration_target
         self.entered_fc_level = entered_fc_level
+        self.prefetches = prefetches or {} # FID -> task fetching that candidate's player data (registration.prefetch_players)
 
 
         options = []
@@ -112,6 +115,11 @@ class PossibleNameSelect(Select):
                     bot_log.error(f"Could not map selected FID {player_fid} back to original name in bot cache! Using typed name '{original_typed_name}' as fallback.")
                     confirmed_chief_name = original_typed_name # Fallback
 
+                # Usually already fetched while the user was choosing
+                api_data = await registration.prefetched_result(self.prefetches, player_fid)
+                if api_data:
+                    bot_log.info(f"Using prefetched API data for FID {player_fid}.")
+
                 # Use the _process_registration from the main registration module
                 await registration._process_registration(
                     bot=interaction.client, # Pass bot instance
@@ -122,7 +130,8 @@ class PossibleNameSelect(Select):
                     chief_name_input=confirmed_chief_name,
                     entered_fc_level=self.entered_fc_level,
                     registration_target=self.registration_target,
-                    confirmed_player_fid=player_fid
+                    confirmed_player_fid=player_fid,
+                    existing_api_data=api_data
                 )
             except ValueError:
                 bot_log.error(f"Invalid FID value '{selected_value}' in fuzzy select callback.")
@@ -130,10 +139,10 @@ class PossibleNameSelect(Select):
 
 
 class PossibleNameView(View):
-    def __init__(self, possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level):
+    def __init__(self, possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level, prefetches=None):
         super().__init__(timeout=180)
         # Pass required data for the select, not the full interaction object
-        select = PossibleNameSelect(possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level)
+        select = PossibleNameSelect(possible_matches, original_chief_name_input, event, time_slot, is_substitute, registration_target, entered_fc_level, prefetches)
         self.add_item(select)
         # Store data needed for timeout message update if necessary
         self._original_chief_name_input = original_chief_name_input
@@ -210,15 +219,16 @@ class ChiefNameModal(Modal, title="Input Registration Details"):
         bot_log.info(f"   Submitter: {interaction.user.name}({interaction.user.id}) | Intent: '{self.registration_target}'")
         bot_log.info(f"   Input: Chief='{chief_name_input}', FC={furnace_level}, Event='{self.event}', Slot='{self.time_slot}', IsSub={self.is_substitute}")
 
-        # Use the lookup function that leverages the bot's loaded data
-        lookup_results = lookup.find_player_by_name(interaction.client, chief_name_input)
+        # Staged resolver: exact -> normalized -> prefix -> n-gram -> full fuzzy scan
+        match_stage, lookup_results = await lookup.resolve_player_name(interaction.client, chief_name_input)
+        bot_log.info(f"   Name resolution for '{chief_name_input}' answered by stage '{match_stage}'.")
         exact_match_fid = None
         possible_matches = []
 
-        if lookup_results and isinstance(lookup_results, tuple): # Exact match returned
-            name_from_lookup, exact_match_fid, _ = lookup_results # Unpack name, fid, score (score is 100)
+        if lookup_results and isinstance(lookup_results, tuple): # Single confident match returned
+            name_from_lookup, exact_match_fid, _ = lookup_results # Unpack name, fid, score
             chief_name_to_use = name_from_lookup # Use the canonical name from lookup
-            bot_log.info(f"   Exact match found for '{chief_name_input.lower()}': FID {exact_match_fid}, Canonical Name '{chief_name_to_use}'")
+            bot_log.info(f"   Match found for '{chief_name_input.lower()}' ({match_stage}): FID {exact_match_fid}, Canonical Name '{chief_name_to_use}'")
 
             # Call the _process_registration function from the registration module
             await registration._process_registration(
@@ -240,12 +250,15 @@ class ChiefNameModal(Modal, title="Input Registration Details"):
 
             if possible_matches:
                 bot_log.info(f"   Found {len(possible_matches)} potential fuzzy matches for '{chief_name_input}'. Showing select menu.")
+                # Fetch the best candidates' player data while the user reads the list and picks
+                prefetches = registration.prefetch_players(interaction.client.api_session, [fid for _, fid, _ in possible_matches])
                 # Pass only necessary data, not the interaction object itself, to the view
                 view = PossibleNameView(
                     possible_matches=possible_matches,
                     original_chief_name_input=chief_name_input, # Pass the typed name
                     event=self.event, time_slot=self.time_slot, is_substitute=self.is_substitute,
-                    registration_target=self.registration_target, entered_fc_level=furnace_level
+                    registration_target=self.registration_target, entered_fc_level=furnace_level,
+                    prefetches=prefetches
                 )
                 # Edit the interaction's original response to show the fuzzy select view
                 # Since we deferred ephemerally, we can use edit_original_response
@@ -401,7 +414,7 @@ class SettingsView(discord.ui.View):
             await interaction.response.send_message(f"{config.EMOJI_SUCCESS} Foundry event enabled", ephemeral=True)
         
         # Update the registration embed if it exists
-        asyncio.create_task(state.update_registration_embed(self.bot))
+        state.schedule_embed_update(self.bot)
     
     @discord.ui.button(label="Toggle Canyon", emoji=config.EMOJI_EVENT, style=discord.ButtonStyle.primary)
     async def toggle_canyon_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -414,7 +427,7 @@ class SettingsView(discord.ui.View):
             await interaction.response.send_message(f"{config.EMOJI_SUCCESS} Canyon event enabled", ephemeral=True)
             
         # Update the registration embed if it exists
-        asyncio.create_task(state.update_registration_embed(self.bot))
+        state.schedule_embed_update(self.bot)
             
     @discord.ui.button(label="Close", style=discord.ButtonStyle.secondary, emoji=config.EMOJI_CANCEL)
     async def close_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -584,7 +597,7 @@ class EventSelectionView(View):
 
         # Use the database function to get user registrations
         # Assuming database.get_user_registrations exists and returns a list of registrations
-        user_regs = database.get_user_registrations(user_id)
+        user_regs = await db_async.get_user_registrations(user_id)
 
         if not user_regs:
             await interaction.followup.send(f"{config.EMOJI_INFO} You haven't submitted any registrations using this bot.", ephemeral=True)
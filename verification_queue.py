@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import random
+import time
+import config
+import db_async
+import rate_limiter
+import registration
+import state
+
+bot_log = logging.getLogger('registration_bot')
+
+# Registrations saved while the player API was unavailable are queued by FID
+# in the verification_queue table (in the same transaction as the
+# registration). This worker re-checks due FIDs in the background at
+# PRIORITY_BACKGROUND, a few at a time, and writes the verified FC level,
+# kingdom and canonical chief name back to every registration of that FID.
+# Transient failures back off exponentially; the queue survives restarts.
+
+_wakeup: asyncio.Event | None = None
+_stats = {'verified': 0, 'retried': 0, 'dropped': 0}
+# FID -> time before which it isn't retried, for FIDs whose new next_attempt_at
+# couldn't be written; otherwise they would stay due and be retried every pass
+_held: dict[int, float] = {}
+
+def notify():
+    """Wakes the worker, e.g. right after a registration was queued."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+def _backoff(attempts: int) -> float:
+    delay = min(config.VERIFY_QUEUE_MAX_BACKOFF, config.VERIFY_QUEUE_BACKOFF * 2 ** attempts)
+    return delay * random.uniform(0.8, 1.2) # Jitter, so a backlog doesn't retry in lockstep
+
+async def _reschedule(fid: int, attempts: int, error: str) -> float:
+    """Pushes the FID's next attempt back by the backoff for `attempts`; returns the delay."""
+    delay = _backoff(attempts)
+    try:
+        saved = await db_async.reschedule_verification(fid, time.time() + delay, error)
+    except Exception as e:
+        bot_log.error(f"Unexpected error rescheduling verification for FID {fid}: {e}", exc_info=True)
+        saved = False
+    if not saved:
+        _held[fid] = time.time() + delay
+    return delay
+
+async def _verify(fid: int, attempts: int) -> bool:
+    """Checks one FID. Returns True if its registrations changed."""
+    result = await registration.call_player_api(None, fid, priority=rate_limiter.PRIORITY_BACKGROUND)
+    if result and not result.get("error"):
+        level = result.get("stove_lv")
+        outcome = await db_async.apply_player_verification(
+            fid, result.get("nickname"), level, registration.get_display_level(level) if level is not None else None, result.get("kid"))
+        if outcome is None:
+            await _reschedule(fid, attempts, "database error")
+            return False
+        _stats['verified'] += 1
+        bot_log.info(f"Re-verified FID {fid}: FC {level}, {outcome['updated']} registration(s) updated, {outcome['renamed']} renamed.")
+        return outcome['updated'] > 0
+
+    error = (result.get("msg") or result.get("error")) if result else "No response"
+    # Anything but a definite answer about this player is retried; e.g. a config_error must not empty the queue
+    if registration.is_permanent_failure(result):
+        _stats['dropped'] += 1
+        if not await db_async.drop_verification(fid, error):
+            _held[fid] = time.time() + _backoff(attempts)
+        bot_log.warning(f"Re-verification of FID {fid} failed permanently ({error}); keeping the entered FC level.")
+    else:
+        _stats['retried'] += 1
+        delay = await _reschedule(fid, attempts, error)
+        bot_log.info(f"Re-verification of FID {fid} failed ({error}); attempt {attempts + 1}, retrying in {delay:.0f}s.")
+    return False
+
+async def run_verification_queue(bot):
+    """Background task: drains the verification queue for as long as the bot runs."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    semaphore = asyncio.Semaphore(config.VERIFY_QUEUE_CONCURRENCY)
+
+    async def verify_bounded(item: dict) -> bool:
+        async with semaphore:
+            try:
+                return await _verify(item['player_fid'], item['attempts'])
+            except Exception as e:
+                bot_log.error(f"Unexpected error re-verifying FID {item['player_fid']}: {e}", exc_info=True)
+                await _reschedule(item['player_fid'], item['attempts'], str(e))
+                return False
+
+    bot_log.info("Verification queue worker started.")
+    failed_passes = 0
+    while True:
+        _wakeup.clear()
+        try:
+            now = time.time()
+            for fid in [fid for fid, until in _held.items() if until <= now]:
+                del _held[fid]
+            # Held FIDs are still due in the table; fetch enough rows that they can't crowd out the rest
+            due = await db_async.get_due_verifications(now, config.VERIFY_QUEUE_BATCH_SIZE + len(_held))
+            due = [item for item in due if item['player_fid'] not in _held][:config.VERIFY_QUEUE_BATCH_SIZE]
+            if due:
+                changed = await asyncio.gather(*(verify_bounded(item) for item in due))
+                if any(changed):
+                    state.schedule_embed_update(bot) # Chief names may have changed
+                failed_passes = 0
+                continue
+
+            stats = await db_async.get_verification_queue_stats()
+            # A next_attempt_at at or before `now` belongs to a held FID; wait for its hold instead
+            wake_times = [at for at in (stats['next_attempt_at'], *_held.values()) if at is not None and at > now]
+            delay = min([config.VERIFY_QUEUE_IDLE_POLL, *(at - time.time() for at in wake_times)])
+            failed_passes = 0
+        except Exception as e:
+            delay = _backoff(failed_passes)
+            failed_passes += 1
+            bot_log.error(f"Verification queue pass failed: {e}; retrying in {delay:.0f}s.", exc_info=True)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), max(0.0, delay))
+        except asyncio.TimeoutError:
+            pass
+
+def get_stats() -> dict:
+    return dict(_stats)